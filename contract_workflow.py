@@ -10,7 +10,12 @@ from pathlib import Path
 from openai import OpenAI
 import requests
 from dotenv import load_dotenv
-from ui_utils import compute_file_md5
+from ui_utils import (
+    dumps_json_bytes,
+    get_file_md5_cached,
+    loads_json,
+    write_bytes_atomic,
+)
 
 # 加载 .env 文件中的环境变量（相对项目根目录）
 PROJECT_ROOT = Path(__file__).resolve().parent
@@ -36,8 +41,11 @@ class ContractWorkflow:
         llm_api_key: Optional[str] = None,
         llm_api_base_url: Optional[str] = None,
         llm_model_name: Optional[str] = None,
+        http_session: Optional[requests.Session] = None,
     ):
         self.mcp_url = mcp_url
+        # 复用调用方传入的会话（连接池），未传入时自建
+        self.http_session = http_session or requests.Session()
         api_key = (llm_api_key or os.environ.get("LLM_API_KEY", "")).strip()
         base_url = (llm_api_base_url or os.environ.get("LLM_API_BASE_URL", "")).strip()
         default_model = "ernie-4.5-turbo-128k"
@@ -108,7 +116,7 @@ class ContractWorkflow:
     def _parse_document(self, file_path: str) -> Optional[str]:
         """步骤1: 解析文档获取文本内容"""
         try:
-            response = requests.post(
+            response = self.http_session.post(
                 f"{self.mcp_url}/tools/parse_contract",
                 json={"file_path": file_path},
                 timeout=60,
@@ -118,7 +126,7 @@ class ContractWorkflow:
                 logger.error(f"MCP服务调用失败: {response.status_code}")
                 return None
 
-            result = response.json()
+            result = loads_json(response.content)
 
             if "error" in result:
                 logger.error(f"文档解析错误: {result['error']}")
@@ -448,7 +456,7 @@ class ContractWorkflow:
         """步骤4: 整合所有结果"""
         logger.info("整合分析结果...")
 
-        file_content_hash = compute_file_md5(file_path)
+        file_content_hash = get_file_md5_cached(file_path)
 
         return {
             "file_path": file_path,
@@ -477,8 +485,7 @@ class ContractWorkflow:
                 output_dir, f"contract_analysis_{timestamp}.json"
             )
 
-            with open(output_file, "w", encoding="utf-8") as f:
-                json.dump(result, f, ensure_ascii=False, indent=2)
+            write_bytes_atomic(output_file, dumps_json_bytes(result))
 
             logger.info(f"分析结果已保存到: {output_file}")
             return output_file
@@ -492,14 +499,14 @@ class ContractWorkflow:
     ) -> Optional[Dict]:
         """生成高亮版本的文档"""
         try:
-            response = requests.post(
+            response = self.http_session.post(
                 f"{self.mcp_url}/tools/highlight_contract",
                 json={"original_path": file_path, "issues": issues},
                 timeout=180,
             )
 
             if response.status_code == 200:
-                return response.json()
+                return loads_json(response.content)
             else:
                 logger.error(f"高亮生成失败: {response.status_code}")
                 return None
@@ -5,9 +5,9 @@ import uvicorn
 from docx import Document
 from pdfminer.high_level import extract_text
 import fitz
+import io
 import os
 import re
-from tempfile import NamedTemporaryFile
 import logging
 from typing import List, Dict
 import platform
@@ -235,7 +235,6 @@ def _highlight_pdf(original_path: str, issues: List[Dict]):
     """生成高亮PDF文件"""
     try:
         doc = fitz.open(original_path)
-        output_path = NamedTemporaryFile(delete=False, suffix=".pdf").name
 
         for issue in issues:
             if not issue or not isinstance(issue, dict):
@@ -260,13 +259,12 @@ def _highlight_pdf(original_path: str, issues: List[Dict]):
                         highlight.set_colors(stroke=[1, 1, 0])
                     highlight.update()
 
-        doc.save(output_path)
+        # 直接在内存中序列化，省去临时文件的写入与回读
+        file_content = doc.tobytes()
         doc.close()
 
-        logger.info(f"PDF高亮完成，生成文件: {output_path}")
+        logger.info(f"PDF高亮完成，文件大小: {len(file_content)} 字节")
 
-        with open(output_path, "rb") as f:
-            file_content = f.read()
         file_base64 = base64.b64encode(file_content).decode("utf-8")
 
         return {
@@ -284,7 +282,6 @@ def _highlight_docx(original_path: str, issues: List[Dict]):
     """生成高亮Word文件"""
     try:
         doc = Document(original_path)
-        output_path = NamedTemporaryFile(delete=False, suffix=".docx").name
 
         for issue in issues:
             if not issue or not isinstance(issue, dict):
@@ -306,13 +303,13 @@ def _highlight_docx(original_path: str, issues: List[Dict]):
                             else:
                                 run.font.highlight_color = 7
 
-        doc.save(output_path)
+        buffer = io.BytesIO()
+        doc.save(buffer)
 
-        logger.info(f"Word高亮完成，生成文件: {output_path}")
+        logger.info(f"Word高亮完成，文件大小: {buffer.tell()} 字节")
 
-        with open(output_path, "rb") as f:
-            file_content = f.read()
-        file_base64 = base64.b64encode(file_content).decode("utf-8")
+        # getbuffer() 返回 memoryview，编码时不再额外复制一份字节
+        file_base64 = base64.b64encode(buffer.getbuffer()).decode("utf-8")
 
         return {
             "status": "success",
@@ -1,11 +1,15 @@
 # ui_ocr_utils.py
 
 import os
-import base64
-from typing import Dict, List, Optional, Any
+from functools import lru_cache
+from itertools import chain, repeat
+from typing import Dict, List, Optional, Any, Tuple
+import numpy as np
 import streamlit as st
-import requests
 from ui_utils import (
+    b64encode,
+    get_http_session,
+    loads_json,
     load_cached_parse_result,
     save_parse_result,
     preview_file_content,
@@ -13,10 +17,38 @@ from ui_utils import (
 
 A4_WIDTH_PX = 794
 A4_HEIGHT_PX = 1123
-
-
-def call_online_parse_api(file_path: str) -> Optional[Dict[str, Any]]:
-    """调用布局解析在线API，并返回markdown和原始JSON"""
+DEFAULT_PAGE_WIDTH = 1200
+_ALIGNMENTS = ("left", "center", "right")
+# 3 的倍数：各块编码结果无填充，可直接拼接
+BASE64_CHUNK_SIZE = 3 * 64 * 1024
+# 条款定位只匹配末尾若干字符，N-gram 索引按此长度构建
+CLAUSE_SUFFIX_LEN = 6
+
+
+def _padded(seq, fill):
+    """在序列末尾无限补充 fill，与 zip 搭配时以较短的主序列为准且无需逐项判断下标"""
+    return chain(seq, repeat(fill))
+
+
+def _encode_file_base64(file_path: str) -> str:
+    """分块读取并 base64 编码文件，避免同时持有完整原始字节与编码结果"""
+    encoded = bytearray()
+    with open(file_path, "rb") as file:
+        while True:
+            chunk = file.read(BASE64_CHUNK_SIZE)
+            if not chunk:
+                break
+            encoded += b64encode(chunk)
+    return encoded.decode("ascii")
+
+
+def call_online_parse_api(
+    file_path: str, file_hash: Optional[str] = None
+) -> Optional[Dict[str, Any]]:
+    """调用布局解析在线API，并返回markdown和原始JSON
+
+    file_hash 为调用方已知的文件内容哈希，用于定位解析缓存。
+    """
     original_file_name = st.session_state.get("file_name")
     api_url = (
         st.session_state.get("ocr_api_url")
@@ -34,15 +66,15 @@ def call_online_parse_api(file_path: str) -> Optional[Dict[str, Any]]:
         st.warning("请先在左侧的“接口配置”中填写OCR访问令牌")
         return None
 
-    cached_result = load_cached_parse_result(file_path, original_file_name)
+    cached_result = load_cached_parse_result(
+        file_path, original_file_name, file_hash=file_hash
+    )
     if cached_result:
         print(f"从缓存加载解析结果: {file_path}")
         return cached_result
 
     try:
-        with open(file_path, "rb") as file:
-            file_bytes = file.read()
-            file_data = base64.b64encode(file_bytes).decode("ascii")
+        file_data = _encode_file_base64(file_path)
 
         headers = {
             "Content-Type": "application/json",
@@ -58,11 +90,13 @@ def call_online_parse_api(file_path: str) -> Optional[Dict[str, Any]]:
             "useChartRecognition": False,
         }
 
-        resp = requests.post(api_url, json=payload, headers=headers, timeout=120)
+        resp = get_http_session().post(
+            api_url, json=payload, headers=headers, timeout=120
+        )
         if resp.status_code != 200:
             st.error(f"在线解析失败，状态码: {resp.status_code}")
             return None
-        api_json = resp.json()
+        api_json = loads_json(resp.content)
         result = api_json.get("result", {})
 
         layout_results = result.get("layoutParsingResults", []) or []
@@ -79,7 +113,13 @@ def call_online_parse_api(file_path: str) -> Optional[Dict[str, Any]]:
         json_result = result
 
         if json_result and markdown_text:
-            save_parse_result(file_path, json_result, markdown_text, original_file_name)
+            save_parse_result(
+                file_path,
+                json_result,
+                markdown_text,
+                original_file_name,
+                file_hash=file_hash,
+            )
 
         result_payload = {
             "json_result": json_result,
@@ -93,21 +133,23 @@ def call_online_parse_api(file_path: str) -> Optional[Dict[str, Any]]:
         return None
 
 
-def find_text_positions_in_json(
-    clause_text: str, json_result: Dict[str, Any]
-) -> List[Dict[str, Any]]:
-    """通过文本匹配在JSON中查找条款的位置信息"""
-    if not clause_text or not json_result:
-        return []
+@lru_cache(maxsize=8192)
+def normalize_whitespace(text: str) -> str:
+    """将连续空白压缩为单个空格并去除首尾空白；结果缓存，重复文本只规范化一次"""
+    return " ".join(text.split())
 
-    clause_text_clean = " ".join(clause_text.split())
 
-    if len(clause_text_clean) >= 6:
-        search_text = clause_text_clean[-6:]
-    else:
-        search_text = clause_text_clean
+def build_text_position_index(
+    json_result: Dict[str, Any]
+) -> List[Tuple[str, Dict[str, Any]]]:
+    """预先规范化JSON中所有块文本与OCR文本，返回 (规范化文本, 位置信息) 列表
+
+    同一文档需要查询多个条款时，只遍历和规范化一次JSON。
+    """
+    index: List[Tuple[str, Dict[str, Any]]] = []
+    if not json_result:
+        return index
 
-    matches = []
     layout_results = json_result.get("layoutParsingResults", [])
 
     for layout_idx, layout_result in enumerate(layout_results):
@@ -119,57 +161,146 @@ def find_text_positions_in_json(
             if not block_content:
                 continue
 
-            block_content_clean = " ".join(block_content.split())
-
-            if search_text in block_content_clean:
-                match_start = block_content_clean.find(search_text)
-                match_end = match_start + len(search_text)
-                matches.append(
+            index.append(
+                (
+                    normalize_whitespace(block_content),
                     {
                         "block_id": block.get("block_id"),
                         "block_content": block_content,
                         "block_bbox": block.get("block_bbox", []),
-                        "match_text": search_text,
-                        "match_start": match_start,
-                        "match_end": match_end,
                         "layout_idx": layout_idx,
                         "source": "parsing_res_list",
-                    }
+                    },
                 )
+            )
 
         overall_ocr = pruned_result.get("overall_ocr_res", {})
         rec_texts = overall_ocr.get("rec_texts", [])
         rec_boxes = overall_ocr.get("rec_boxes", [])
         rec_polys = overall_ocr.get("rec_polys", [])
 
-        for idx, rec_text in enumerate(rec_texts):
+        for idx, (rec_text, box, poly) in enumerate(
+            zip(rec_texts, _padded(rec_boxes, []), _padded(rec_polys, []))
+        ):
             if not rec_text:
                 continue
 
-            rec_text_clean = " ".join(rec_text.split())
-
-            if search_text in rec_text_clean:
-                box = rec_boxes[idx] if idx < len(rec_boxes) else []
-                poly = rec_polys[idx] if idx < len(rec_polys) else []
-                match_start = rec_text_clean.find(search_text)
-                match_end = match_start + len(search_text)
-                matches.append(
+            index.append(
+                (
+                    normalize_whitespace(rec_text),
                     {
                         "block_id": f"ocr_{idx}",
                         "block_content": rec_text,
                         "block_bbox": box if box else [],
                         "rec_poly": poly,
-                        "match_text": search_text,
-                        "match_start": match_start,
-                        "match_end": match_end,
                         "layout_idx": layout_idx,
                         "source": "overall_ocr_res",
-                    }
+                    },
                 )
+            )
+
+    return index
+
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def get_text_position_index(
+    source_hash: str, _json_result: Dict[str, Any]
+) -> List[Tuple[str, Dict[str, Any]]]:
+    """按源文件哈希缓存文本位置索引，跨 rerun/会话共享同一对象，调用方不得修改"""
+    return build_text_position_index(_json_result)
+
+
+def build_suffix_gram_index(
+    index: List[Tuple[str, Dict[str, Any]]],
+) -> Dict[str, List[Tuple[int, int]]]:
+    """为位置索引构建 CLAUSE_SUFFIX_LEN 长度的倒排索引
+
+    返回 {gram: [(条目下标, 首次出现偏移), ...]}，条目下标按索引顺序递增。
+    """
+    n = CLAUSE_SUFFIX_LEN
+    grams: Dict[str, List[Tuple[int, int]]] = {}
+    for entry_idx, (text_clean, _) in enumerate(index):
+        seen = set()
+        for offset in range(len(text_clean) - n + 1):
+            gram = text_clean[offset : offset + n]
+            if gram in seen:
+                continue
+            seen.add(gram)
+            grams.setdefault(gram, []).append((entry_idx, offset))
+    return grams
+
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def get_suffix_gram_index(
+    source_hash: str, _json_result: Dict[str, Any]
+) -> Dict[str, List[Tuple[int, int]]]:
+    """按源文件哈希缓存 N-gram 倒排索引，调用方不得修改"""
+    return build_suffix_gram_index(get_text_position_index(source_hash, _json_result))
+
+
+def find_text_positions_in_json(
+    clause_text: str,
+    json_result: Dict[str, Any],
+    index: Optional[List[Tuple[str, Dict[str, Any]]]] = None,
+    gram_index: Optional[Dict[str, List[Tuple[int, int]]]] = None,
+) -> List[Dict[str, Any]]:
+    """通过文本匹配在JSON中查找条款的位置信息
+
+    index 为 build_text_position_index 的结果；批量查询时传入以避免重复遍历JSON。
+    gram_index 为同一 index 的 build_suffix_gram_index 结果，传入时以字典查找代替逐条扫描。
+    """
+    if not clause_text or not json_result:
+        return []
+
+    clause_text_clean = normalize_whitespace(clause_text)
+
+    if len(clause_text_clean) >= CLAUSE_SUFFIX_LEN:
+        search_text = clause_text_clean[-CLAUSE_SUFFIX_LEN:]
+    else:
+        search_text = clause_text_clean
+
+    if index is None:
+        index = build_text_position_index(json_result)
+
+    if gram_index is not None and len(search_text) == CLAUSE_SUFFIX_LEN:
+        hits = (
+            (index[entry_idx][1], offset)
+            for entry_idx, offset in gram_index.get(search_text, ())
+        )
+    else:
+        hits = (
+            (location, text_clean.find(search_text)) for text_clean, location in index
+        )
+
+    matches = []
+    for location, match_start in hits:
+        if match_start == -1:
+            continue
+        matches.append(
+            {
+                **location,
+                "match_text": search_text,
+                "match_start": match_start,
+                "match_end": match_start + len(search_text),
+            }
+        )
 
     return matches
 
 
+@st.cache_data(show_spinner=False, max_entries=1024)
+def find_text_positions_cached(
+    source_hash: str, clause_text: str, _json_result: Dict[str, Any]
+) -> List[Dict[str, Any]]:
+    """按 (源文件哈希, 条款文本) 缓存定位结果，风险点筛选变化时已定位过的条款无需重新查找"""
+    return find_text_positions_in_json(
+        clause_text,
+        _json_result,
+        get_text_position_index(source_hash, _json_result),
+        get_suffix_gram_index(source_hash, _json_result),
+    )
+
+
 def _classify_font_size(font_size: float) -> tuple[str, float]:
     """将字体大小分类为大、中、小三类，并返回标准大小"""
     if font_size < 16:
@@ -210,7 +341,9 @@ def _calculate_font_size_from_poly(poly: List[List[float]]) -> float:
     return 14.0
 
 
-def _get_text_alignment(poly: List[List[float]], page_width: float = 1200) -> str:
+def _get_text_alignment(
+    poly: List[List[float]], page_width: float = DEFAULT_PAGE_WIDTH
+) -> str:
     """根据文本起始位置判断对齐方式，强制分类为左、中、右三类"""
     if not poly or len(poly) < 4:
         return "left"
@@ -236,27 +369,18 @@ def _get_text_alignment(poly: List[List[float]], page_width: float = 1200) -> st
         return "center"
 
 
-def _extract_ocr_text_elements(layout_result: Dict[str, Any]) -> List[Dict[str, Any]]:
-    """从layout_result中提取所有OCR文本元素及其位置信息，并按行组织"""
+def _collect_text_elements(
+    rec_texts: List[str], rec_polys: List[Any], rec_scores: List[float]
+) -> List[Dict[str, Any]]:
+    """逐个计算OCR文本框的位置与大小（多边形形状不一致时使用）"""
     text_elements = []
 
-    pruned_result = layout_result.get("prunedResult", {})
-    overall_ocr = pruned_result.get("overall_ocr_res", {})
-
-    if not overall_ocr:
-        return text_elements
-
-    rec_texts = overall_ocr.get("rec_texts", [])
-    rec_polys = overall_ocr.get("rec_polys", [])
-    rec_scores = overall_ocr.get("rec_scores", [])
-
-    for idx, text in enumerate(rec_texts):
+    for text, poly, score in zip(
+        rec_texts, _padded(rec_polys, []), _padded(rec_scores, 0.0)
+    ):
         if not text or not text.strip():
             continue
 
-        poly = rec_polys[idx] if idx < len(rec_polys) else []
-        score = rec_scores[idx] if idx < len(rec_scores) else 0.0
-
         if poly and len(poly) >= 4:
             # 计算位置和大小
             x_coords = [p[0] for p in poly if len(p) >= 1]
@@ -280,6 +404,7 @@ def _extract_ocr_text_elements(layout_result: Dict[str, Any]) -> List[Dict[str,
                 text_elements.append(
                     {
                         "text": text,
+                        "text_clean": normalize_whitespace(text),
                         "x": min_x,
                         "y": min_y,
                         "width": width,
@@ -291,78 +416,172 @@ def _extract_ocr_text_elements(layout_result: Dict[str, Any]) -> List[Dict[str,
                     }
                 )
 
-    if text_elements:
-        text_elements.sort(key=lambda e: (e["y"], e["x"]))
-
-        lines = []
-        current_line = []
-        line_y = None
-        line_height = None
-
-        for elem in text_elements:
-            elem_y = elem["y"]
-            elem_height = elem["height"]
-
-            if (
-                line_y is None
-                or abs(elem_y - line_y) > (line_height or elem_height) * 1.5
-            ):
-                if current_line:
-                    # 先按 y 坐标排序（从上到下），再按 x 坐标排序（从左到右）
-                    current_line.sort(key=lambda e: (e["y"], e["x"]))
-                    avg_font_size = sum(e["font_size"] for e in current_line) / len(
-                        current_line
-                    )
-                    _, line_font_size = _classify_font_size(avg_font_size)
-
-                    line_min_x = min(e["x"] for e in current_line)
-                    line_max_x = max(e["x"] + e["width"] for e in current_line)
-                    line_width = line_max_x - line_min_x
-                    line_alignment = current_line[0]["alignment"]
-
-                    lines.append(
-                        {
-                            "elements": current_line,
-                            "y": line_y,
-                            "x": line_min_x,
-                            "width": line_width,
-                            "height": line_height,
-                            "font_size": line_font_size,
-                            "alignment": line_alignment,
-                        }
-                    )
-                current_line = [elem]
-                line_y = elem_y
-                line_height = elem_height
-            else:
-                current_line.append(elem)
-                line_height = max(line_height or elem_height, elem_height)
-
-        if current_line:
-            # 先按 y 坐标排序（从上到下），再按 x 坐标排序（从左到右）
-            current_line.sort(key=lambda e: (e["y"], e["x"]))
-            avg_font_size = sum(e["font_size"] for e in current_line) / len(
-                current_line
-            )
-            _, line_font_size = _classify_font_size(avg_font_size)
-
-            line_min_x = min(e["x"] for e in current_line)
-            line_max_x = max(e["x"] + e["width"] for e in current_line)
-            line_width = line_max_x - line_min_x
-            line_alignment = current_line[0]["alignment"]
-
-            lines.append(
-                {
-                    "elements": current_line,
-                    "y": line_y,
-                    "x": line_min_x,
-                    "width": line_width,
-                    "height": line_height,
-                    "font_size": line_font_size,
-                    "alignment": line_alignment,
-                }
-            )
+    return text_elements
+
+
+def _collect_text_elements_vectorized(
+    rec_texts: List[str], rec_polys: List[Any], rec_scores: List[float]
+) -> Optional[List[Dict[str, Any]]]:
+    """用NumPy一次性计算所有OCR文本框的位置、大小、字号与对齐方式
 
-        return lines
+    分类规则与 _calculate_font_size_from_poly / _get_text_alignment 一致；
+    多边形形状不一致、无法组成 (N, 点数, 2) 数值数组时返回 None。
+    """
+    count = min(len(rec_texts), len(rec_polys))
+    if count == 0:
+        return []
+
+    try:
+        polys = np.asarray(rec_polys[:count])
+    except ValueError:
+        return None
+    if (
+        polys.ndim != 3
+        or polys.shape[1] < 4
+        or polys.shape[2] < 2
+        or polys.dtype.kind not in "iuf"
+    ):
+        return None
+
+    xs = polys[:, :, 0]
+    ys = polys[:, :, 1]
+    min_x = xs.min(axis=1)
+    min_y = ys.min(axis=1)
+    width = xs.max(axis=1) - min_x
+    height = ys.max(axis=1) - min_y
+
+    raw_font_size = height * 0.8
+    font_size = np.where(
+        raw_font_size < 16, 14.0, np.where(raw_font_size <= 24, 18.0, 24.0)
+    )
+    left_threshold = DEFAULT_PAGE_WIDTH * 0.35
+    right_threshold = DEFAULT_PAGE_WIDTH * 0.65
+    alignment_code = np.where(
+        min_x < left_threshold, 0, np.where(min_x > right_threshold, 2, 1)
+    )
+
+    keep = np.flatnonzero((width >= 5) & (height >= 5)).tolist()
+    min_x_list = min_x.tolist()
+    min_y_list = min_y.tolist()
+    width_list = width.tolist()
+    height_list = height.tolist()
+    font_size_list = font_size.tolist()
+    alignment_list = alignment_code.tolist()
+    score_count = len(rec_scores)
+
+    text_elements = []
+    for idx in keep:
+        text = rec_texts[idx]
+        if not text or not text.strip():
+            continue
+        text_elements.append(
+            {
+                "text": text,
+                "text_clean": normalize_whitespace(text),
+                "x": min_x_list[idx],
+                "y": min_y_list[idx],
+                "width": width_list[idx],
+                "height": height_list[idx],
+                "font_size": font_size_list[idx],
+                "alignment": _ALIGNMENTS[alignment_list[idx]],
+                "poly": rec_polys[idx],
+                "score": rec_scores[idx] if idx < score_count else 0.0,
+            }
+        )
+
+    return text_elements
+
+
+def _find_line_starts(ys: List[float], heights: List[float]) -> List[int]:
+    """对已按 (y, x) 排序的文本框划分行，返回每行首个文本框的下标
+
+    与当前行起始 y 的距离超过行内最大高度的 1.5 倍时另起一行。
+    """
+    if not ys:
+        return []
+
+    line_starts = [0]
+    line_y = ys[0]
+    line_height = heights[0]
+    # 热循环：避免每个元素一次 max() 调用与 None 判断
+    for idx in range(1, len(ys)):
+        elem_y = ys[idx]
+        elem_height = heights[idx]
+        if abs(elem_y - line_y) > (line_height or elem_height) * 1.5:
+            line_starts.append(idx)
+            line_y = elem_y
+            line_height = elem_height
+        elif elem_height > line_height:
+            line_height = elem_height
+    return line_starts
+
+
+def _extract_ocr_text_elements(layout_result: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """从layout_result中提取所有OCR文本元素及其位置信息，并按行组织"""
+    pruned_result = layout_result.get("prunedResult", {})
+    overall_ocr = pruned_result.get("overall_ocr_res", {})
+
+    if not overall_ocr:
+        return []
+
+    rec_texts = overall_ocr.get("rec_texts", [])
+    rec_polys = overall_ocr.get("rec_polys", [])
+    rec_scores = overall_ocr.get("rec_scores", [])
+
+    text_elements = _collect_text_elements_vectorized(rec_texts, rec_polys, rec_scores)
+    if text_elements is None:
+        text_elements = _collect_text_elements(rec_texts, rec_polys, rec_scores)
+
+    if not text_elements:
+        return []
+
+    # 行聚类采用 SoA 布局：各属性保存为并列数组，排序与逐行统计交给NumPy
+    xs = np.array([e["x"] for e in text_elements])
+    ys = np.array([e["y"] for e in text_elements])
+    # 先按 y 坐标排序（从上到下），再按 x 坐标排序（从左到右）；lexsort 为稳定排序
+    order = np.lexsort((xs, ys))
+    elements = [text_elements[i] for i in order.tolist()]
+    xs = xs[order]
+    ys = ys[order]
+    widths = np.array([e["width"] for e in elements])
+    heights = np.array([e["height"] for e in elements])
+    font_sizes = np.array([e["font_size"] for e in elements], dtype=float)
+
+    line_starts = _find_line_starts(ys.tolist(), heights.tolist())
+    starts = np.array(line_starts)
+    counts = np.diff(np.append(starts, len(elements)))
+    avg_font_sizes = np.add.reduceat(font_sizes, starts) / counts
+    line_font_sizes = np.where(
+        avg_font_sizes < 16, 14.0, np.where(avg_font_sizes <= 24, 18.0, 24.0)
+    )
+    line_min_xs = np.minimum.reduceat(xs, starts)
+    line_widths = np.maximum.reduceat(xs + widths, starts) - line_min_xs
+    line_heights = np.maximum.reduceat(heights, starts)
+
+    lines = []
+    bounds = line_starts + [len(elements)]
+    for line_idx, (line_x, line_width, line_h, line_font_size) in enumerate(
+        zip(
+            line_min_xs.tolist(),
+            line_widths.tolist(),
+            line_heights.tolist(),
+            line_font_sizes.tolist(),
+        )
+    ):
+        current_line = elements[bounds[line_idx] : bounds[line_idx + 1]]
+        lines.append(
+            {
+                "elements": current_line,
+                "text_clean": normalize_whitespace(
+                    "".join([elem["text"] for elem in current_line])
+                ),
+                "y": current_line[0]["y"],
+                "x": line_x,
+                "width": line_width,
+                "height": line_h,
+                "font_size": line_font_size,
+                "alignment": current_line[0]["alignment"],
+            }
+        )
 
-    return []
+    return lines
@@ -1,14 +1,32 @@
 # ui_rendering.py
 
 import os
-import json
-import base64
-from typing import Dict, List, Any
+import hashlib
+import html
+import importlib.util
+import re
+import shutil
+import threading
+from bisect import bisect_right
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+import numpy as np
 import streamlit as st
-from ui_utils import preview_file_content, load_cached_parse_result, compute_file_md5
+from ui_utils import (
+    b64encode,
+    dumps_json_bytes,
+    dumps_json_sorted,
+    preview_file_content,
+    load_cached_parse_result,
+    get_file_md5_cached,
+    fitz_lock,
+)
 from ui_ocr_utils import (
     call_online_parse_api,
+    build_text_position_index,
+    normalize_whitespace,
     find_text_positions_in_json,
+    find_text_positions_cached,
     A4_WIDTH_PX,
     A4_HEIGHT_PX,
     _classify_font_size,
@@ -17,6 +35,250 @@ from ui_ocr_utils import (
     _extract_ocr_text_elements,
 )
 
+RISK_LEVEL_ICONS = {"高": "🔴", "中": "🟡", "低": "🟢"}
+RISK_LEVEL_LABELS = {"高": "重大风险", "中": "一般风险", "低": "低风险"}
+RISK_FILTER_OPTIONS = ("全部", "重大风险", "一般风险", "低风险")
+RISK_HIGHLIGHT_CLASSES = {
+    "高": "risk-highlight risk-high",
+    "中": "risk-highlight risk-medium",
+    "低": "risk-highlight risk-low",
+}
+_RISK_LABEL_TO_LEVEL = {label: level for level, label in RISK_LEVEL_LABELS.items()}
+
+# mistune 比 Markdown 库快一个数量级，安装时优先使用
+if importlib.util.find_spec("mistune"):
+    mistune = importlib.import_module("mistune")
+    _mistune_markdown = mistune.create_markdown(
+        escape=False, plugins=["table", "strikethrough", "url", "footnotes"]
+    )
+else:  # pragma: no cover - 兼容未安装依赖的情况
+    mistune = None
+    _mistune_markdown = None
+# 长文档 Markdown 按段落切块渲染，每块约此字符数，屏幕外的块由浏览器跳过布局
+MARKDOWN_TILE_CHARS = 12000
+# 顶层 ATX 标题行，以及引用式链接/脚注/缩写定义行（后者出现时整篇文档不切分）
+_MARKDOWN_HEADING_RE = re.compile(r" {0,3}#{1,6}(?:[ \t]|$)")
+_MARKDOWN_DEFINITION_RE = re.compile(r"^ {0,3}\*?\[[^\]\n]+\]:", re.MULTILINE)
+# 预览栏宽度约为 A4 页宽，1.5 倍在 1x 屏上已足够清晰；高 DPR 屏幕可通过环境变量调高
+DEFAULT_PDF_PREVIEW_ZOOM = 1.5
+PDF_PREVIEW_JPEG_QUALITY = 80
+# 单次 translate 完成HTML转义与换行替换
+_HTML_ESCAPE_TABLE = str.maketrans(
+    {"&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;", "'": "&#39;", "\n": "<br>"}
+)
+# 渲染前同步栅格化当前页前后各若干页；开启静态服务时，内联窗口内的其余页由后台线程按距离由近到远写入
+PDF_PREVIEW_WINDOW = 1
+# 默认（未开启静态服务）内联 data URI，仅内联当前页前后各若干页，其余页输出等比例占位
+PDF_PREVIEW_INLINE_WINDOW = 5
+# 显式开启 server.enableStaticServing 时（默认关闭）预览图写入此目录，以 app/static/ URL 引用
+# 注意：static/ 下的文件对任何能访问本服务的客户端公开，目录名为文件 MD5，仅靠其不可猜测性保护
+PDF_PREVIEW_STATIC_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "static", "previews"
+)
+# 静态目录最多保留最近使用的若干个文件的预览图，新文件写入前清理其余目录
+DEFAULT_PDF_PREVIEW_STATIC_MAX_DOCS = 20
+try:
+    PDF_PREVIEW_STATIC_MAX_DOCS = max(
+        1, int(os.getenv("PDF_PREVIEW_STATIC_MAX_DOCS", "") or DEFAULT_PDF_PREVIEW_STATIC_MAX_DOCS)
+    )
+except ValueError:
+    PDF_PREVIEW_STATIC_MAX_DOCS = DEFAULT_PDF_PREVIEW_STATIC_MAX_DOCS
+# fitz 操作经 fitz_lock 串行化；后台线程仅预取当前页附近尚未写入的页面
+_pdf_prefetch_inflight = set()
+_pdf_prefetch_lock = threading.Lock()
+
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def _get_pdf_page_sizes(file_path: str, mtime_ns: int) -> List[Tuple[float, float]]:
+    """读取PDF各页 (宽, 高)；mtime_ns 仅作为缓存键，文件修改后自动失效"""
+    import fitz  # PyMuPDF
+
+    with fitz_lock, fitz.open(file_path) as doc:
+        return [(page.rect.width, page.rect.height) for page in doc]
+
+
+def _rasterize_pdf_page(file_path: str, page_idx: int, zoom: float) -> bytes:
+    """栅格化PDF单页为 JPEG 字节
+
+    预览用途使用 JPEG，编码更快、体积更小；不带透明通道，静态图片地址可按页码预先确定。
+    """
+    import fitz  # PyMuPDF
+
+    with fitz_lock, fitz.open(file_path) as doc:
+        pix = doc.load_page(page_idx).get_pixmap(
+            matrix=fitz.Matrix(zoom, zoom), alpha=False
+        )
+        return pix.tobytes("jpeg", jpg_quality=PDF_PREVIEW_JPEG_QUALITY)
+
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def _render_pdf_page_data_uri(
+    file_path: str, mtime_ns: int, page_idx: int, zoom: float
+) -> str:
+    """栅格化PDF单页并返回图片 data URI，按 (路径, 修改时间, 页码, 缩放) 缓存"""
+    img_bytes = _rasterize_pdf_page(file_path, page_idx, zoom)
+    return f"data:image/jpeg;base64,{b64encode(img_bytes).decode()}"
+
+
+def _pdf_page_static_name(file_md5: str, page_idx: int, zoom: float) -> str:
+    """静态目录下单页图片的相对路径（previews/ 之后的部分）"""
+    return f"{file_md5}/p{page_idx + 1}_z{zoom:g}.jpeg"
+
+
+def _pdf_page_static_url(file_md5: str, page_idx: int, zoom: float) -> str:
+    return f"app/static/previews/{_pdf_page_static_name(file_md5, page_idx, zoom)}"
+
+
+def _prepare_pdf_preview_dir(file_md5: str):
+    """标记该文件的预览目录为最近使用；首次创建时按最近使用时间清理多余的旧目录"""
+    page_dir = os.path.join(PDF_PREVIEW_STATIC_DIR, file_md5)
+    try:
+        os.utime(page_dir)
+        return
+    except FileNotFoundError:
+        pass
+    except OSError:
+        return
+
+    try:
+        with os.scandir(PDF_PREVIEW_STATIC_DIR) as entries:
+            dirs = [
+                (entry.stat().st_mtime, entry.path)
+                for entry in entries
+                if entry.is_dir() and entry.name != file_md5
+            ]
+    except OSError:
+        dirs = []
+    dirs.sort(reverse=True)
+    for _, stale_dir in dirs[PDF_PREVIEW_STATIC_MAX_DOCS - 1 :]:
+        shutil.rmtree(stale_dir, ignore_errors=True)
+    os.makedirs(page_dir, exist_ok=True)
+
+
+def _ensure_pdf_page_static(
+    file_path: str, file_md5: str, page_idx: int, zoom: float
+) -> bool:
+    """确保PDF单页图片已写入静态目录，失败时返回 False"""
+    target = os.path.join(
+        PDF_PREVIEW_STATIC_DIR, _pdf_page_static_name(file_md5, page_idx, zoom)
+    )
+    if os.path.exists(target):
+        return True
+
+    try:
+        img_bytes = _rasterize_pdf_page(file_path, page_idx, zoom)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp_path = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(img_bytes)
+        os.replace(tmp_path, target)
+    except Exception:
+        return False
+    return True
+
+
+def _prefetch_pdf_pages_static(
+    file_path: str, file_md5: str, page_idxs: List[int], zoom: float
+):
+    """在后台线程中按给定顺序栅格化页面到静态目录，滚动或翻页时可直接命中"""
+    with _pdf_prefetch_lock:
+        pending = [
+            idx for idx in page_idxs if (file_md5, idx, zoom) not in _pdf_prefetch_inflight
+        ]
+        _pdf_prefetch_inflight.update((file_md5, idx, zoom) for idx in pending)
+    if not pending:
+        return
+
+    def worker():
+        for idx in pending:
+            try:
+                _ensure_pdf_page_static(file_path, file_md5, idx, zoom)
+            finally:
+                with _pdf_prefetch_lock:
+                    _pdf_prefetch_inflight.discard((file_md5, idx, zoom))
+
+    threading.Thread(target=worker, daemon=True).start()
+
+
+def _build_pdf_page_srcs(
+    file_path: str,
+    mtime_ns: int,
+    page_count: int,
+    window_start: int,
+    window_end: int,
+    anchor_page: int,
+    zoom: float,
+) -> List[Optional[str]]:
+    """返回各页图片地址（按页序），None 表示输出占位块
+
+    仅覆盖当前页前后 PDF_PREVIEW_INLINE_WINDOW 页：默认内联 data URI；
+    开启静态服务时引用静态文件URL，窗口内的页同步写入，其余尚未写入的页交给后台线程，
+    配合 loading="lazy" 浏览器在页面滚动到附近时才请求。
+    """
+    inline_start = max(1, window_start - PDF_PREVIEW_INLINE_WINDOW + PDF_PREVIEW_WINDOW)
+    inline_end = min(page_count, window_end + PDF_PREVIEW_INLINE_WINDOW - PDF_PREVIEW_WINDOW)
+    file_md5 = (
+        get_file_md5_cached(file_path)
+        if st.get_option("server.enableStaticServing")
+        else None
+    )
+    if not file_md5:
+        return [
+            _render_pdf_page_data_uri(file_path, mtime_ns, page_num - 1, zoom)
+            if inline_start <= page_num <= inline_end
+            else None
+            for page_num in range(1, page_count + 1)
+        ]
+
+    _prepare_pdf_preview_dir(file_md5)
+    srcs: List[Optional[str]] = []
+    missing = []
+    for page_num in range(1, page_count + 1):
+        page_idx = page_num - 1
+        if not inline_start <= page_num <= inline_end:
+            srcs.append(None)
+        elif window_start <= page_num <= window_end:
+            if _ensure_pdf_page_static(file_path, file_md5, page_idx, zoom):
+                srcs.append(_pdf_page_static_url(file_md5, page_idx, zoom))
+            else:
+                srcs.append(_render_pdf_page_data_uri(file_path, mtime_ns, page_idx, zoom))
+        else:
+            srcs.append(_pdf_page_static_url(file_md5, page_idx, zoom))
+            static_path = os.path.join(
+                PDF_PREVIEW_STATIC_DIR, _pdf_page_static_name(file_md5, page_idx, zoom)
+            )
+            if not os.path.exists(static_path):
+                missing.append(page_idx)
+    if missing:
+        missing.sort(key=lambda page_idx: abs(page_idx + 1 - anchor_page))
+        _prefetch_pdf_pages_static(file_path, file_md5, missing, zoom)
+    return srcs
+
+
+def _get_pdf_preview_zoom() -> float:
+    """读取预览栅格化倍率，可由 PDF_PREVIEW_ZOOM 环境变量覆盖"""
+    try:
+        zoom = float(os.getenv("PDF_PREVIEW_ZOOM", "") or DEFAULT_PDF_PREVIEW_ZOOM)
+    except ValueError:
+        return DEFAULT_PDF_PREVIEW_ZOOM
+    return zoom if zoom > 0 else DEFAULT_PDF_PREVIEW_ZOOM
+
+
+def _pdf_page_html(
+    page_num: int,
+    page_count: int,
+    page_size: Tuple[float, float],
+    img_src: Optional[str],
+) -> str:
+    """生成单页预览HTML；img_src 为空时按页面宽高比输出占位块"""
+    if img_src:
+        # 异步解码，避免大图解码阻塞主线程；按原始宽高比预留高度，图片未加载时滚动位置不跳动
+        body = f'<img src="{img_src}" alt="第 {page_num} 页生成中" decoding="async" loading="lazy" style="width: 100%; max-width: 100%; height: auto; aspect-ratio: {page_size[0]} / {page_size[1]}; border: 1px solid #ddd; border-radius: 4px; box-shadow: 0 2px 4px rgba(0,0,0,0.1); display: block; margin: 10px auto;" />'
+    else:
+        # 未内联的页按原始宽高比占位，保持滚动高度与同步滚动比例不变
+        body = f'<div style="width: 100%; aspect-ratio: {page_size[0]} / {page_size[1]}; border: 1px dashed #ddd; border-radius: 4px; margin: 10px auto; display: flex; align-items: center; justify-content: center; color: #999; font-size: 12px;">翻到此页后加载</div>'
+    return f'<div id="pdf-page-{page_num}" style="margin-bottom: 20px; text-align: center;">{body}<div style="margin-top: 10px; color: #666; font-size: 12px;">第 {page_num} 页 / 共 {page_count} 页</div></div>'
+
 
 def render_file_preview(file_path: str, height: int = 780):
     """左侧源文件预览"""
@@ -24,10 +286,11 @@ def render_file_preview(file_path: str, height: int = 780):
 
     if file_ext == ".pdf":
         try:
-            import fitz  # PyMuPDF
-
-            doc = fitz.open(file_path)
-            if doc.page_count == 0:
+            mtime_ns = os.stat(file_path).st_mtime_ns
+            zoom = _get_pdf_preview_zoom()
+            page_sizes = _get_pdf_page_sizes(file_path, mtime_ns)
+            page_count = len(page_sizes)
+            if page_count == 0:
                 st.warning("PDF 无页面可预览")
                 return
 
@@ -35,26 +298,40 @@ def render_file_preview(file_path: str, height: int = 780):
             current_page = int(st.session_state.get(page_key, 1))
             if current_page < 1:
                 current_page = 1
-            if current_page > doc.page_count:
-                current_page = doc.page_count
-
-            page_images = []
-            for page_num in range(doc.page_count):
-                page = doc.load_page(page_num)
-                pix = page.get_pixmap(matrix=fitz.Matrix(2.5, 2.5))
-                img_bytes = pix.tobytes("png")
-                img_base64 = base64.b64encode(img_bytes).decode()
-                page_images.append({"page_num": page_num + 1, "img_base64": img_base64})
+            if current_page > page_count:
+                current_page = page_count
 
             container_id = f"pdf-container-{os.path.basename(file_path).replace('.', '_').replace(' ', '_')}"
             scroll_key = f"scroll_to_page_{page_key}"
             target_page = st.session_state.get(scroll_key, current_page)
-
-            pages_html_content = ""
-            for page_data in page_images:
-                page_num = page_data["page_num"]
-                img_base64 = page_data["img_base64"]
-                pages_html_content += f'<div id="pdf-page-{page_num}" style="margin-bottom: 20px; text-align: center;"><img src="data:image/png;base64,{img_base64}" style="width: 100%; max-width: 100%; height: auto; border: 1px solid #ddd; border-radius: 4px; box-shadow: 0 2px 4px rgba(0,0,0,0.1); display: block; margin: 10px auto;" /><div style="margin-top: 10px; color: #666; font-size: 12px;">第 {page_num} 页 / 共 {doc.page_count} 页</div></div>'
+            window_start = max(1, min(current_page, target_page) - PDF_PREVIEW_WINDOW)
+            window_end = min(page_count, max(current_page, target_page) + PDF_PREVIEW_WINDOW)
+
+            # 文件与显示窗口均未变化时（如右侧标签切换、同步滚动引起的 rerun）直接复用上次的页面HTML
+            pages_cache_key = (file_path, mtime_ns, window_start, window_end, zoom)
+            pages_cache = st.session_state.get("_pdf_pages_html_cache")
+            if pages_cache and pages_cache[0] == pages_cache_key:
+                pages_html_content = pages_cache[1]
+            else:
+                page_srcs = _build_pdf_page_srcs(
+                    file_path,
+                    mtime_ns,
+                    page_count,
+                    window_start,
+                    window_end,
+                    target_page,
+                    zoom,
+                )
+                pages_html_content = "".join(
+                    _pdf_page_html(page_num, page_count, page_size, img_src)
+                    for page_num, (page_size, img_src) in enumerate(
+                        zip(page_sizes, page_srcs), 1
+                    )
+                )
+                st.session_state["_pdf_pages_html_cache"] = (
+                    pages_cache_key,
+                    pages_html_content,
+                )
 
             # 构建完整的HTML
             html_content = f"""
@@ -112,7 +389,7 @@ def render_file_preview(file_path: str, height: int = 780):
                 new_val = st.number_input(
                     "页码",
                     min_value=1,
-                    max_value=doc.page_count,
+                    max_value=page_count,
                     value=current_page,
                     step=1,
                     key=f"num_{page_key}",
@@ -124,7 +401,7 @@ def render_file_preview(file_path: str, height: int = 780):
                     st.rerun()
             with ctrl_right:
                 if st.button("下一页", width="stretch", key=f"next_{page_key}"):
-                    new_page = min(doc.page_count, current_page + 1)
+                    new_page = min(page_count, current_page + 1)
                     if new_page != current_page:
                         st.session_state[page_key] = new_page
                         st.session_state[scroll_key] = new_page
@@ -148,110 +425,41 @@ def render_file_preview(file_path: str, height: int = 780):
         )
 
 
-def render_preview_panel(file_path: str, preview_text: str):
-    """两栏预览：左侧源文件，右侧识别结果对照，支持同步滚动"""
-
-    current_hash = st.session_state.get("file_hash")
-    if not current_hash:
-        current_hash = compute_file_md5(file_path)
-        st.session_state.file_hash = current_hash
-
-    if (
-        st.session_state.ocr_parsed_file_hash != current_hash
-        or st.session_state.ocr_parsed_file_path != file_path
-    ):
-        original_file_name = st.session_state.get("file_name")
-        cached_result = load_cached_parse_result(file_path, original_file_name)
-        if cached_result:
-            st.session_state.ocr_parse_result = cached_result
-            st.session_state.ocr_parsed_file_path = file_path
-            st.session_state.ocr_parsed_original_file_name = original_file_name
-            st.session_state.ocr_parsed_file_hash = current_hash
-        else:
-            st.session_state.ocr_parse_result = None
-            st.session_state.ocr_parsed_file_path = None
-            st.session_state.ocr_parsed_original_file_name = None
-            st.session_state.ocr_parsed_file_hash = None
-
-    sync_scroll_js = """
+# 左右两栏同步滚动脚本。内容固定不变，rerun 时 Streamlit 复用同一 iframe 而不会重新挂载
+_SYNC_SCROLL_JS = """
     <script>
     (function() {
+        // 同一文档内只初始化一次，避免重复注册观察器与滚动监听
+        if (window.__syncScrollInstalled) return;
+        window.__syncScrollInstalled = true;
+        
         let leftPanel = null;
         let rightPanel = null;
         let isScrolling = false;
         
+        // 只检查左侧PDF容器与文本框，避免对全部DOM节点逐个 getComputedStyle
+        const PANEL_SELECTOR = '[id^="pdf-container-"], textarea';
+        
         function findScrollablePanels() {
-            const allElements = document.querySelectorAll('*');
-            const scrollableElements = [];
-            
-            for (let el of allElements) {
-                const style = window.getComputedStyle(el);
-                const hasScroll = el.scrollHeight > el.clientHeight;
-                const isScrollable = style.overflow === 'auto' || 
-                                    style.overflow === 'scroll' || 
-                                    style.overflowY === 'auto' || 
-                                    style.overflowY === 'scroll';
-                
-                if (hasScroll && isScrollable && el.offsetHeight > 200) {
-                    scrollableElements.push(el);
-                }
-            }
-            
-            const textareas = Array.from(document.querySelectorAll('textarea'));
-            let rightTextarea = null;
-            
-            for (let ta of textareas) {
-                const rect = ta.getBoundingClientRect();
-                if (rect.left > window.innerWidth / 2 && 
-                    ta.scrollHeight > ta.clientHeight) {
-                    rightTextarea = ta;
-                    break;
-                }
-            }
-            
+            const half = window.innerWidth / 2;
             let leftPanel = null;
+            let rightPanel = null;
             
-            for (let el of scrollableElements) {
+            for (let el of document.querySelectorAll(PANEL_SELECTOR)) {
+                if (el.scrollHeight <= el.clientHeight) continue;
                 const rect = el.getBoundingClientRect();
-                if (rect.left < window.innerWidth / 2) {
-                    if (el.id && el.id.includes('pdf-container')) {
-                        leftPanel = el;
-                        break;
-                    }
-                    if (el.querySelector('img') || el.tagName === 'TEXTAREA') {
+                if (rect.left < half) {
+                    if (!leftPanel || (el.id && !leftPanel.id)) {
                         leftPanel = el;
-                        break;
-                    }
-                }
-            }
-            
-            if (!leftPanel && scrollableElements.length > 0) {
-                scrollableElements.sort((a, b) => {
-                    return a.getBoundingClientRect().left - b.getBoundingClientRect().left;
-                });
-                leftPanel = scrollableElements[0];
-            }
-            
-            if (leftPanel && rightTextarea && leftPanel !== rightTextarea) {
-                return [leftPanel, rightTextarea];
-            }
-            
-            if (leftPanel && !rightTextarea && scrollableElements.length >= 2) {
-                for (let el of scrollableElements) {
-                    const rect = el.getBoundingClientRect();
-                    if (rect.left > window.innerWidth / 2 && el !== leftPanel) {
-                        return [leftPanel, el];
                     }
+                } else if (!rightPanel) {
+                    rightPanel = el;
                 }
             }
             
-            if (scrollableElements.length >= 2) {
-                scrollableElements.sort((a, b) => {
-                    return a.getBoundingClientRect().left - b.getBoundingClientRect().left;
-                });
-                return [scrollableElements[0], scrollableElements[1]];
+            if (leftPanel && rightPanel && leftPanel !== rightPanel) {
+                return [leftPanel, rightPanel];
             }
-            
             return null;
         }
         
@@ -273,9 +481,11 @@ def render_preview_panel(file_path: str, preview_text: str):
             const scrollRatio = sourceScrollTop / (sourceScrollHeight - sourceClientHeight);
             const targetScrollTop = scrollRatio * (targetScrollHeight - targetClientHeight);
             
-            target.scrollTop = targetScrollTop;
-            
-            setTimeout(() => { isScrolling = false; }, 10);
+            // 写入放到下一帧，同一帧内的多次滚动事件只触发一次布局
+            requestAnimationFrame(() => {
+                target.scrollTop = targetScrollTop;
+                setTimeout(() => { isScrolling = false; }, 10);
+            });
         }
         
         function initSyncScroll() {
@@ -296,17 +506,40 @@ def render_preview_panel(file_path: str, preview_text: str):
                 
                 leftPanel.addEventListener('scroll', leftPanel._syncScrollHandler, { passive: true });
                 rightPanel.addEventListener('scroll', rightPanel._syncScrollHandler, { passive: true });
+                
+                // 绑定成功后只监听两栏所在的列容器，不再响应整个页面的变化
+                const scope = leftPanel.closest('[data-testid="stHorizontalBlock"]');
+                if (scope && scope.contains(rightPanel)) {
+                    observeScope(scope);
+                }
             }
         }
         
-        const observer = new MutationObserver(() => {
-            setTimeout(initSyncScroll, 100);
-        });
+        // DOM 变化通常成批出现，合并为一次延迟初始化
+        let initPending = false;
+        function scheduleInitSyncScroll() {
+            if (initPending) return;
+            initPending = true;
+            setTimeout(() => {
+                initPending = false;
+                initSyncScroll();
+            }, 150);
+        }
         
-        observer.observe(document.body, {
-            childList: true,
-            subtree: true
-        });
+        const observer = new MutationObserver(scheduleInitSyncScroll);
+        let observedNode = null;
+        
+        function observeScope(node) {
+            if (node === observedNode) return;
+            observer.disconnect();
+            observer.observe(node, {
+                childList: true,
+                subtree: true
+            });
+            observedNode = node;
+        }
+        
+        observeScope(document.body);
         
         setTimeout(initSyncScroll, 1000);
         
@@ -317,7 +550,48 @@ def render_preview_panel(file_path: str, preview_text: str):
     </script>
     """
 
-    st.components.v1.html(sync_scroll_js, height=0)
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def _format_json_preview_by_hash(source_hash: str, _json_result: Dict[str, Any]) -> str:
+    """按源文件哈希缓存JSON标签页的缩进文本；下划线参数不参与 Streamlit 哈希"""
+    return dumps_json_bytes(_json_result).decode("utf-8")
+
+
+def _format_json_preview(json_result: Dict[str, Any], source_hash: Optional[str]) -> str:
+    """生成JSON标签页文本，有源文件哈希时跨 rerun 只序列化一次"""
+    if not source_hash:
+        return dumps_json_bytes(json_result).decode("utf-8")
+    return _format_json_preview_by_hash(source_hash, json_result)
+
+
+def render_preview_panel(file_path: str, preview_text: str):
+    """两栏预览：左侧源文件，右侧识别结果对照，支持同步滚动"""
+
+    current_hash = st.session_state.get("file_hash")
+    if not current_hash:
+        current_hash = get_file_md5_cached(file_path)
+        st.session_state.file_hash = current_hash
+
+    if (
+        st.session_state.ocr_parsed_file_hash != current_hash
+        or st.session_state.ocr_parsed_file_path != file_path
+    ):
+        original_file_name = st.session_state.get("file_name")
+        cached_result = load_cached_parse_result(
+            file_path, original_file_name, file_hash=current_hash
+        )
+        if cached_result:
+            st.session_state.ocr_parse_result = cached_result
+            st.session_state.ocr_parsed_file_path = file_path
+            st.session_state.ocr_parsed_original_file_name = original_file_name
+            st.session_state.ocr_parsed_file_hash = current_hash
+        else:
+            st.session_state.ocr_parse_result = None
+            st.session_state.ocr_parsed_file_path = None
+            st.session_state.ocr_parsed_original_file_name = None
+            st.session_state.ocr_parsed_file_hash = None
+
+    st.components.v1.html(_SYNC_SCROLL_JS, height=0)
 
     left, right = st.columns([1, 1], gap="large")
 
@@ -343,7 +617,9 @@ def render_preview_panel(file_path: str, preview_text: str):
                         "json_result", {}
                     )
                     if json_result:
-                        html_content = generate_html_layout(json_result, [])
+                        html_content = generate_html_layout_cached(
+                            json_result, [], st.session_state.get("ocr_parsed_file_hash")
+                        )
                         st.components.v1.html(html_content, height=780, scrolling=True)
                     else:
                         st.info("暂无JSON结果，无法进行版面恢复。")
@@ -393,7 +669,9 @@ def render_preview_panel(file_path: str, preview_text: str):
                         "json_result", {}
                     )
                     if json_result:
-                        json_value = json.dumps(json_result, ensure_ascii=False, indent=2)
+                        json_value = _format_json_preview(
+                            json_result, st.session_state.get("ocr_parsed_file_hash")
+                        )
                         has_json = True
                         if st.session_state.get(widget_key) != json_value:
                             st.session_state[widget_key] = json_value
@@ -414,258 +692,201 @@ def render_preview_panel(file_path: str, preview_text: str):
                 )
 
 
-def format_json_result_as_text(json_result: Dict[str, Any]) -> str:
-    """从JSON中提取文字、位置、排版等信息并格式化为可读文本"""
-    if not json_result:
-        return "暂无JSON结果"
+def _classify_text_block(
+    text: str, position: List[float]
+) -> Tuple[str, str, List[str]]:
+    """一次性解析布局位置与文本，返回 (位置描述, 排版方式, 非空文本行)
 
-    lines = []
+    排版方式取值：horizontal（逐字竖排但整体横向）、vertical、single、multi。
+    """
+    aspect_ratio = None
+    direction_hint = ""
+    if position and len(position) >= 4:
+        x, y, w, h = position[0], position[1], position[2], position[3]
+        if w > 0 and h > 0:
+            aspect_ratio = w / h
+            if aspect_ratio > 2.0:
+                direction_hint = " [水平]"
+            elif aspect_ratio < 0.5:
+                direction_hint = " [垂直]"
+        pos_str = f"[位置: ({x}, {y}) 尺寸: {w}×{h}{direction_hint}]"
+    else:
+        pos_str = "[位置: N/A]"
+
+    text_lines = text.split("\n")
+    non_empty_lines = [line for line in text_lines if line.strip()]
 
+    if aspect_ratio is not None and aspect_ratio > 1.2 and all(
+        len(line.strip()) == 1 for line in non_empty_lines
+    ):
+        variant = "horizontal"
+    elif aspect_ratio is not None and aspect_ratio < 0.8:
+        variant = "vertical"
+    elif len(text_lines) == 1:
+        variant = "single"
+    else:
+        variant = "multi"
+    return pos_str, variant, non_empty_lines
+
+
+def _iter_layout_lines(layout: Dict[str, Any], indent_level: int = 0) -> Iterator[str]:
+    """格式化单个布局元素，突出显示文本和位置信息"""
+    indent = "  " * indent_level
+    layout_type = layout.get("type", "N/A")
+    sub_type = layout.get("sub_type", "")
+    text = layout.get("text", "").strip()
+    type_label = f"{layout_type}/{sub_type}" if sub_type else f"{layout_type}"
+    pos_str, variant, non_empty_lines = _classify_text_block(
+        text, layout.get("position", [])
+    )
+
+    if not text:
+        yield f"{indent}【{type_label}】{layout.get('layout_id', 'N/A')} {pos_str}"
+        return
+
+    yield f"{indent}【{type_label}】{pos_str}"
+    if variant == "horizontal":
+        horizontal_text = "".join(line.strip() for line in non_empty_lines)
+        yield f"{indent}  文本（水平）: {horizontal_text}"
+        return
+    if variant == "single":
+        yield f"{indent}  文本: {text}"
+        return
+
+    yield f"{indent}  文本（垂直排列）:" if variant == "vertical" else f"{indent}  文本:"
+    for line in non_empty_lines:
+        yield f"{indent}    {line}"
+
+
+def _iter_layout_tree_lines(
+    layout: Dict[str, Any],
+    layout_dict: Dict[Any, Dict[str, Any]],
+    processed: set,
+    indent_level: int = 0,
+) -> Iterator[str]:
+    """按先序遍历布局树并输出文本内容，使用显式栈代替递归"""
+    stack = [(layout, indent_level)]
+    while stack:
+        node, depth = stack.pop()
+        layout_id = node.get("layout_id")
+        # 出栈时才判重，与递归版本的访问顺序一致
+        if layout_id in processed:
+            continue
+
+        processed.add(layout_id)
+        yield from _iter_layout_lines(node, depth)
+
+        children_ids = node.get("children", []) or []
+        for child_id in reversed(children_ids):
+            if child_id in layout_dict:
+                stack.append((layout_dict[child_id], depth + 1))
+
+
+def _iter_position_lines(label: str, items: List[Dict], id_key: str) -> Iterator[str]:
+    """逐行输出表格/图片等元素的编号与位置"""
+    for i, item in enumerate(items):
+        yield f"  {label} {i+1}: ID={item.get(id_key, 'N/A')}"
+        if "position" in item:
+            pos = item["position"]
+            if len(pos) >= 4:
+                yield f"    位置: ({pos[0]}, {pos[1]}) 尺寸: {pos[2]}×{pos[3]}"
+
+
+def _iter_json_result_lines(json_result: Dict[str, Any]) -> Iterator[str]:
+    """逐行生成 format_json_result_as_text 的输出"""
     if "file_name" in json_result:
-        lines.append(f"📄 文件名: {json_result.get('file_name', 'N/A')}")
-        lines.append(f"🆔 文件ID: {json_result.get('file_id', 'N/A')}")
-        lines.append("")
+        yield f"📄 文件名: {json_result.get('file_name', 'N/A')}"
+        yield f"🆔 文件ID: {json_result.get('file_id', 'N/A')}"
+        yield ""
 
     # 处理页面信息
     pages = json_result.get("pages", [])
-    if pages:
-        lines.append(f"📑 共 {len(pages)} 页")
-        lines.append("=" * 80)
-        lines.append("")
-
-        for page_idx, page in enumerate(pages):
-            page_num = page.get("page_num", page_idx)
-            page_id = page.get("page_id", f"page-{page_idx}")
-
-            lines.append(f"📄 第 {page_num + 1} 页 (page_id: {page_id})")
-            lines.append("-" * 80)
-
-            meta = page.get("meta", {})
-            if meta:
-                page_width = meta.get("page_width", 0)
-                page_height = meta.get("page_height", 0)
-                lines.append(
-                    f"📏 页面尺寸: {page_width} × {page_height} 像素 | 页面类型: {meta.get('page_type', 'N/A')}"
-                )
-                lines.append("")
-
-            # 优先显示页面完整文本内容
-            page_text = page.get("text", "").strip()
-            if page_text:
-                lines.append("【识别文本内容】")
-                lines.append("-" * 80)
-                lines.append(page_text)
-                lines.append("")
-                lines.append("-" * 80)
-                lines.append("")
-
-            layouts = page.get("layouts", [])
-            if layouts:
-                lines.append(f"【布局结构信息】共 {len(layouts)} 个布局元素")
-                lines.append("")
-
-                layout_dict = {layout.get("layout_id"): layout for layout in layouts}
-                root_layouts = [
-                    layout for layout in layouts if layout.get("parent") == "root"
-                ]
-
-                def format_layout_with_text(layout, indent_level=0):
-                    """格式化单个布局元素，突出显示文本和位置信息"""
-                    indent = "  " * indent_level
-                    layout_id = layout.get("layout_id", "N/A")
-                    layout_type = layout.get("type", "N/A")
-                    sub_type = layout.get("sub_type", "")
-                    text = layout.get("text", "").strip()
-                    position = layout.get("position", [])
-
-                    direction_hint = ""
-                    if position and len(position) >= 4:
-                        x, y, w, h = position[0], position[1], position[2], position[3]
-                        if w > 0 and h > 0:
-                            aspect_ratio = w / h
-                            if aspect_ratio > 2.0:
-                                direction_hint = " [水平]"
-                            elif aspect_ratio < 0.5:
-                                direction_hint = " [垂直]"
-                        pos_str = f"[位置: ({x}, {y}) 尺寸: {w}×{h}{direction_hint}]"
-                    else:
-                        pos_str = "[位置: N/A]"
-
-                    type_label = f"{layout_type}"
-                    if sub_type:
-                        type_label += f"/{sub_type}"
-
-                    result = []
-                    if text:
-                        text_to_display = text
-                        if position and len(position) >= 4:
-                            x, y, w, h = (
-                                position[0],
-                                position[1],
-                                position[2],
-                                position[3],
-                            )
-                            if w > 0 and h > 0:
-                                aspect_ratio = w / h
-                                text_lines = text.split("\n")
-                                is_single_char_per_line = all(
-                                    len(line.strip()) == 1
-                                    for line in text_lines
-                                    if line.strip()
-                                )
-
-                                if aspect_ratio > 1.2 and is_single_char_per_line:
-                                    text_to_display = "".join(
-                                        line.strip()
-                                        for line in text_lines
-                                        if line.strip()
-                                    )
-                                    result.append(f"{indent}【{type_label}】{pos_str}")
-                                    result.append(
-                                        f"{indent}  文本（水平）: {text_to_display}"
-                                    )
-                                elif aspect_ratio < 0.8:
-                                    result.append(f"{indent}【{type_label}】{pos_str}")
-                                    result.append(f"{indent}  文本（垂直排列）:")
-                                    for line in text_lines:
-                                        if line.strip():
-                                            result.append(f"{indent}    {line}")
-                                else:
-                                    if len(text_lines) == 1:
-                                        result.append(
-                                            f"{indent}【{type_label}】{pos_str}"
-                                        )
-                                        result.append(
-                                            f"{indent}  文本: {text_to_display}"
-                                        )
-                                    else:
-                                        result.append(
-                                            f"{indent}【{type_label}】{pos_str}"
-                                        )
-                                        result.append(f"{indent}  文本:")
-                                        for line in text_lines:
-                                            if line.strip():
-                                                result.append(f"{indent}    {line}")
-                            else:
-                                text_lines = text_to_display.split("\n")
-                                if len(text_lines) == 1:
-                                    result.append(f"{indent}【{type_label}】{pos_str}")
-                                    result.append(f"{indent}  文本: {text_to_display}")
-                                else:
-                                    result.append(f"{indent}【{type_label}】{pos_str}")
-                                    result.append(f"{indent}  文本:")
-                                    for line in text_lines:
-                                        if line.strip():
-                                            result.append(f"{indent}    {line}")
-                        else:
-                            text_lines = text_to_display.split("\n")
-                            if len(text_lines) == 1:
-                                result.append(f"{indent}【{type_label}】{pos_str}")
-                                result.append(f"{indent}  文本: {text_to_display}")
-                            else:
-                                result.append(f"{indent}【{type_label}】{pos_str}")
-                                result.append(f"{indent}  文本:")
-                                for line in text_lines:
-                                    if line.strip():
-                                        result.append(f"{indent}    {line}")
-                    else:
-                        result.append(f"{indent}【{type_label}】{layout_id} {pos_str}")
-
-                    return result
-
-                def process_layout_tree_ordered(layout, indent_level=0, processed=None):
-                    """递归处理布局树结构，按顺序展示文本内容"""
-                    if processed is None:
-                        processed = set()
-
-                    layout_id = layout.get("layout_id")
-                    if layout_id in processed:
-                        return []
-
-                    processed.add(layout_id)
-                    result = format_layout_with_text(layout, indent_level)
-
-                    children_ids = layout.get("children", [])
-                    if children_ids:
-                        for child_id in children_ids:
-                            if child_id in layout_dict:
-                                child_layout = layout_dict[child_id]
-                                child_result = process_layout_tree_ordered(
-                                    child_layout, indent_level + 1, processed
-                                )
-                                result.extend(child_result)
-
-                    return result
-
-                processed_ids = set()
-                for root_layout in root_layouts:
-                    layout_lines = process_layout_tree_ordered(
-                        root_layout, indent_level=0, processed=processed_ids
-                    )
-                    lines.extend(layout_lines)
-                    lines.append("")
-
-                orphan_layouts = [
-                    layout
-                    for layout in layouts
-                    if layout.get("layout_id") not in processed_ids
-                ]
-                if orphan_layouts:
-                    lines.append("【其他布局元素】")
-                    for orphan in orphan_layouts:
-                        layout_lines = format_layout_with_text(orphan, indent_level=0)
-                        lines.extend(layout_lines)
-                        lines.append("")
-
-            tables = page.get("tables", [])
-            if tables:
-                lines.append(f"【表格信息】共 {len(tables)} 个表格")
-                for i, table in enumerate(tables):
-                    lines.append(f"  表格 {i+1}: ID={table.get('table_id', 'N/A')}")
-                    if "position" in table:
-                        pos = table["position"]
-                        if len(pos) >= 4:
-                            lines.append(
-                                f"    位置: ({pos[0]}, {pos[1]}) 尺寸: {pos[2]}×{pos[3]}"
-                            )
-                lines.append("")
-
-            images = page.get("images", [])
-            if images:
-                lines.append(f"【图片信息】共 {len(images)} 个图片")
-                for i, image in enumerate(images):
-                    lines.append(f"  图片 {i+1}: ID={image.get('image_id', 'N/A')}")
-                    if "position" in image:
-                        pos = image["position"]
-                        if len(pos) >= 4:
-                            lines.append(
-                                f"    位置: ({pos[0]}, {pos[1]}) 尺寸: {pos[2]}×{pos[3]}"
-                            )
-                lines.append("")
-
-            lines.append("")
-            lines.append("=" * 80)
-            lines.append("")
-
-    return "\n".join(lines)
-
-
-def generate_html_layout(json_result: Dict[str, Any], issues: List[Dict]) -> str:
-    """基于JSON生成HTML版面恢复，并标注风险点"""
+    if not pages:
+        return
+
+    yield f"📑 共 {len(pages)} 页"
+    yield "=" * 80
+    yield ""
+
+    for page_idx, page in enumerate(pages):
+        page_num = page.get("page_num", page_idx)
+        page_id = page.get("page_id", f"page-{page_idx}")
+
+        yield f"📄 第 {page_num + 1} 页 (page_id: {page_id})"
+        yield "-" * 80
+
+        meta = page.get("meta", {})
+        if meta:
+            page_width = meta.get("page_width", 0)
+            page_height = meta.get("page_height", 0)
+            yield f"📏 页面尺寸: {page_width} × {page_height} 像素 | 页面类型: {meta.get('page_type', 'N/A')}"
+            yield ""
+
+        # 优先显示页面完整文本内容
+        page_text = page.get("text", "").strip()
+        if page_text:
+            yield "【识别文本内容】"
+            yield "-" * 80
+            yield page_text
+            yield ""
+            yield "-" * 80
+            yield ""
+
+        layouts = page.get("layouts", [])
+        if layouts:
+            yield f"【布局结构信息】共 {len(layouts)} 个布局元素"
+            yield ""
+
+            # 单次遍历同时建立 id 索引与根节点列表
+            layout_dict = {}
+            root_layouts = []
+            for layout in layouts:
+                layout_dict[layout.get("layout_id")] = layout
+                if layout.get("parent") == "root":
+                    root_layouts.append(layout)
+
+            processed_ids = set()
+            for root_layout in root_layouts:
+                yield from _iter_layout_tree_lines(root_layout, layout_dict, processed_ids)
+                yield ""
+
+            orphan_layouts = [
+                layout
+                for layout in layouts
+                if layout.get("layout_id") not in processed_ids
+            ]
+            if orphan_layouts:
+                yield "【其他布局元素】"
+                for orphan in orphan_layouts:
+                    yield from _iter_layout_lines(orphan)
+                    yield ""
+
+        tables = page.get("tables", [])
+        if tables:
+            yield f"【表格信息】共 {len(tables)} 个表格"
+            yield from _iter_position_lines("表格", tables, "table_id")
+            yield ""
+
+        images = page.get("images", [])
+        if images:
+            yield f"【图片信息】共 {len(images)} 个图片"
+            yield from _iter_position_lines("图片", images, "image_id")
+            yield ""
+
+        yield ""
+        yield "=" * 80
+        yield ""
+
+
+def format_json_result_as_text(json_result: Dict[str, Any]) -> str:
+    """从JSON中提取文字、位置、排版等信息并格式化为可读文本"""
     if not json_result:
-        return "<div>暂无文档内容</div>"
+        return "暂无JSON结果"
+    return "\n".join(_iter_json_result_lines(json_result))
 
-    issue_positions = {}
-    for idx, issue in enumerate(issues):
-        clause_text = issue.get("条款", "")
-        if clause_text:
-            positions = find_text_positions_in_json(clause_text, json_result)
-            if positions:
-                issue_positions[idx] = {"issue": issue, "positions": positions}
 
-    html_parts = []
-    html_parts.append(
-        """
+# 版面恢复HTML的固定样式头与脚本尾，导入时完成 A4 尺寸替换，避免每次生成时重建
+_LAYOUT_HTML_HEADER = """
     <style>
         .document-container {
             font-family: 'SimSun', '宋体', serif;
@@ -773,26 +994,318 @@ def generate_html_layout(json_result: Dict[str, Any], issues: List[Dict]) -> str
         }
     </style>
     <div class="document-container">
-    """.replace(
-            "__A4_WIDTH__", str(A4_WIDTH_PX)
-        ).replace(
-            "__A4_HEIGHT__", str(A4_HEIGHT_PX)
-        )
+    """.replace("__A4_WIDTH__", str(A4_WIDTH_PX)).replace(
+    "__A4_HEIGHT__", str(A4_HEIGHT_PX)
+)
+
+# 精确版面每页的 A4 容器起始标签
+_LAYOUT_PAGE_WRAPPER_OPEN = (
+    f'<div class="page-wrapper" style="width: {A4_WIDTH_PX}px; height: {A4_HEIGHT_PX}px;">'
+)
+
+_LAYOUT_HTML_FOOTER = """
+    <script>
+        // 确保函数在全局作用域中定义
+        window.showTooltip = function(event, tooltipId) {
+            const tooltip = document.getElementById(tooltipId);
+            if (tooltip) {
+                tooltip.classList.add('show');
+                const rect = event.target.getBoundingClientRect();
+                const tooltipRect = tooltip.getBoundingClientRect();
+                
+                // 默认显示在右侧，并垂直居中
+                let left = rect.right + 15; // 15px 偏移量
+                let top = rect.top + rect.height / 2 - tooltipRect.height / 2;
+
+                // 如果右侧空间不足，则显示在左侧
+                if (left + tooltipRect.width > window.innerWidth - 15) {
+                    left = rect.left - tooltipRect.width - 15;
+                }
+
+                // 左侧边界检查
+                if (left < 15) {
+                    left = 15;
+                }
+
+                // 上下边界检查
+                if (top < 15) {
+                    top = 15;
+                }
+                if (top + tooltipRect.height > window.innerHeight - 15) {
+                    top = window.innerHeight - tooltipRect.height - 15;
+                }
+                
+                tooltip.style.left = left + 'px';
+                tooltip.style.top = top + 'px';
+            }
+        };
+        
+        window.hideTooltip = function(tooltipId) {
+            const tooltip = document.getElementById(tooltipId);
+            if (tooltip) {
+                tooltip.classList.remove('show');
+            }
+        };
+        
+    </script>
+    </div>
+    """
+
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def _generate_html_layout_by_key(
+    source_hash: str,
+    issues_digest: str,
+    _json_result: Dict[str, Any],
+    _issues: List[Dict],
+) -> str:
+    """按 (源文件哈希, 风险点摘要) 缓存版面恢复HTML；下划线参数不参与 Streamlit 哈希"""
+    return generate_html_layout(_json_result, _issues, source_hash)
+
+
+def generate_html_layout_cached(
+    json_result: Dict[str, Any], issues: List[Dict], source_hash: Optional[str]
+) -> str:
+    """生成版面恢复HTML，并以 (源文件哈希, 风险点摘要) 为键跨 rerun 复用结果
+
+    source_hash 为空时无法确定 json_result 的来源，改用其内容摘要作为键。
+    """
+    if not source_hash:
+        if not json_result:
+            return generate_html_layout(json_result, issues)
+        source_hash = "json:" + hashlib.blake2b(
+            dumps_json_bytes(json_result), digest_size=16
+        ).hexdigest()
+
+    issues_digest = hashlib.blake2b(
+        dumps_json_sorted(issues), digest_size=8
+    ).hexdigest()
+    return _generate_html_layout_by_key(source_hash, issues_digest, json_result, issues)
+
+
+def _normalize_block_bbox(block_bbox: List[float]) -> Tuple[float, float, float, float]:
+    """将 block_bbox 统一为 (x1, y1, x2, y2)
+
+    block_bbox 可能是 [x1, y1, x2, y2] 或 [x, y, width, height]，按坐标大小关系区分。
+    """
+    x1, y1, third, fourth = block_bbox[:4]
+    if third > x1 and fourth > y1:
+        return x1, y1, third, fourth
+    return x1, y1, x1 + third, y1 + fourth
+
+
+def _match_lines_to_block_bboxes(
+    text_lines: List[Dict[str, Any]],
+    block_boxes: List[Tuple[float, float, float, float]],
+    scale: float,
+) -> List[int]:
+    """批量计算每个文本行按位置命中的首个 block 下标，未命中为 -1
+
+    block_boxes 为已统一成 (x1, y1, x2, y2) 的原始坐标；缩放与 20px 容差在此一次性完成。
+    行中心点落在 block 范围内，或行矩形与 block 有重叠即视为命中。
+    """
+    if not text_lines or not block_boxes:
+        return [-1] * len(text_lines)
+
+    boxes = np.array(block_boxes, dtype=np.float64) * scale
+    tolerance = 20 * scale
+    left = boxes[:, 0] - tolerance
+    top = boxes[:, 1] - tolerance
+    right = boxes[:, 2] + tolerance
+    bottom = boxes[:, 3] + tolerance
+
+    line_x = np.array([line["x"] for line in text_lines], dtype=np.float64)[:, None] * scale
+    line_y = np.array([line["y"] for line in text_lines], dtype=np.float64)[:, None] * scale
+    line_w = np.array([line["width"] for line in text_lines], dtype=np.float64)[:, None] * scale
+    line_h = (
+        np.array([line.get("height", 0) for line in text_lines], dtype=np.float64)[:, None]
+        * scale
+    )
+    center_x = line_x + line_w / 2
+    center_y = line_y + line_h / 2
+
+    center_inside = (
+        (center_x >= left) & (center_x <= right) & (center_y >= top) & (center_y <= bottom)
+    )
+    overlaps = ~(
+        (line_x + line_w < left)
+        | (line_x > right)
+        | (line_y + line_h < top)
+        | (line_y > bottom)
     )
+    hits = center_inside | overlaps
+    return np.where(hits.any(axis=1), hits.argmax(axis=1), -1).tolist()
+
+
+# 条款拼接分隔符，规范化后的OCR文本中不会出现
+_CLAUSE_SEPARATOR = "\x00"
+
+
+def _build_clause_matcher(
+    issue_positions: Dict[int, Dict[str, Any]],
+) -> Callable[[str], Optional[Tuple[int, Dict]]]:
+    """构建“文本包含于哪个条款”的匹配函数，返回首个命中的 (风险点下标, 风险点)
+
+    所有条款规范化后按风险点顺序拼接为一个字符串，单次 str.find 即可找到
+    首个包含该文本的条款，再二分定位其所属风险点；同一文本的结果会被复用。
+    """
+    starts: List[int] = []
+    entries: List[Tuple[int, Dict]] = []
+    clauses: List[str] = []
+    offset = 0
+    for issue_idx, issue_data in issue_positions.items():
+        clause_text = issue_data["issue"].get("条款", "")
+        if not clause_text:
+            continue
+        clause_clean = normalize_whitespace(clause_text)
+        starts.append(offset)
+        entries.append((issue_idx, issue_data["issue"]))
+        clauses.append(clause_clean)
+        offset += len(clause_clean) + len(_CLAUSE_SEPARATOR)
+    haystack = _CLAUSE_SEPARATOR.join(clauses)
+    matches: Dict[str, Optional[Tuple[int, Dict]]] = {}
+
+    def match(text_clean: str) -> Optional[Tuple[int, Dict]]:
+        if text_clean in matches:
+            return matches[text_clean]
+        result = None
+        if _CLAUSE_SEPARATOR in text_clean:
+            for entry, clause_clean in zip(entries, clauses):
+                if text_clean in clause_clean:
+                    result = entry
+                    break
+        else:
+            pos = haystack.find(text_clean)
+            if pos != -1:
+                result = entries[bisect_right(starts, pos) - 1]
+        matches[text_clean] = result
+        return result
+
+    return match
+
+
+def _build_block_text_matcher(
+    blocks_by_text: Dict[str, Dict[str, Any]],
+) -> Callable[[str], Optional[Dict[str, Any]]]:
+    """构建“文本行属于哪个 block”的匹配函数
+
+    先精确匹配；否则按 blocks_by_text 的顺序返回首个与该行互为包含关系的 block。
+    “行包含于 block 文本”通过拼接串上的单次 str.find 求出；
+    “block 文本包含于行”只需检查长度不超过该行的少数短 block。
+    """
+    keys = list(blocks_by_text)
+    starts: List[int] = []
+    offset = 0
+    for key in keys:
+        starts.append(offset)
+        offset += len(key) + len(_CLAUSE_SEPARATOR)
+    haystack = _CLAUSE_SEPARATOR.join(keys)
+    # 按长度排序的 (长度, 顺序下标, 文本)，用于筛选可能被行包含的短 block
+    by_len = sorted((len(key), key_idx, key) for key_idx, key in enumerate(keys))
+    lengths = [item[0] for item in by_len]
+
+    def match(line_text_clean: str) -> Optional[Dict[str, Any]]:
+        if line_text_clean in blocks_by_text:
+            return blocks_by_text[line_text_clean]
+        if _CLAUSE_SEPARATOR in line_text_clean:
+            for key in keys:
+                if line_text_clean in key or key in line_text_clean:
+                    return blocks_by_text[key]
+            return None
+
+        best = len(keys)
+        pos = haystack.find(line_text_clean)
+        if pos != -1:
+            best = bisect_right(starts, pos) - 1
+        for _, key_idx, key in by_len[: bisect_right(lengths, len(line_text_clean))]:
+            if key_idx < best and key in line_text_clean:
+                best = key_idx
+        return blocks_by_text[keys[best]] if best < len(keys) else None
+
+    return match
+
+
+def _render_issue_tooltips(
+    issue_positions: Dict[int, Dict[str, Any]],
+) -> Dict[int, Tuple[str, str]]:
+    """预先为每个风险点生成 (高亮样式类, 提示框内容HTML)，同一风险点的多个命中元素共用"""
+    tooltips = {}
+    for issue_idx, issue_data in issue_positions.items():
+        issue = issue_data["issue"]
+        risk_level = issue.get("风险等级", "低")
+        risk_class = RISK_HIGHLIGHT_CLASSES.get(risk_level, "risk-highlight risk-low")
+        tooltips[issue_idx] = (
+            risk_class,
+            f'<h4>{_escape_html(issue.get("类型", ""))}</h4>'
+            f"<p><strong>风险等级：</strong>{risk_level}</p>"
+            f'<p><strong>问题描述：</strong>{_escape_html(issue.get("问题描述", ""))}</p>'
+            f'<p><strong>修改建议：</strong>{_escape_html(issue.get("修改建议", ""))}</p>'
+            "</div></span>",
+        )
+    return tooltips
+
+
+def generate_html_layout(
+    json_result: Dict[str, Any],
+    issues: List[Dict],
+    source_hash: Optional[str] = None,
+) -> str:
+    """基于JSON生成HTML版面恢复，并标注风险点
+
+    source_hash 为 json_result 对应源文件的哈希；传入时条款定位结果跨 rerun 缓存，
+    否则在本次调用内构建位置索引，并对重复条款只查找一次。
+    """
+    if not json_result:
+        return "<div>暂无文档内容</div>"
 
     layout_results = json_result.get("layoutParsingResults", [])
+    if not layout_results:
+        # 没有版面结果时只输出空文档容器，无需定位条款
+        return _LAYOUT_HTML_HEADER + _LAYOUT_HTML_FOOTER
 
-    use_precise_layout = False
-    for layout_result in layout_results:
-        text_elements = _extract_ocr_text_elements(layout_result)
-        if text_elements:
-            use_precise_layout = True
-            break
+    issue_positions = {}
+    position_index = None
+    positions_by_clause: Dict[str, List[Dict[str, Any]]] = {}
+    for idx, issue in enumerate(issues):
+        clause_text = issue.get("条款", "")
+        if clause_text:
+            positions = positions_by_clause.get(clause_text)
+            if positions is None:
+                if source_hash:
+                    positions = find_text_positions_cached(
+                        source_hash, clause_text, json_result
+                    )
+                else:
+                    if position_index is None:
+                        position_index = build_text_position_index(json_result)
+                    positions = find_text_positions_in_json(
+                        clause_text, json_result, position_index
+                    )
+                positions_by_clause[clause_text] = positions
+            if positions:
+                issue_positions[idx] = {"issue": issue, "positions": positions}
 
-    if use_precise_layout:
-        for layout_idx, layout_result in enumerate(layout_results):
-            text_lines = _extract_ocr_text_elements(layout_result)
+    html_parts = [_LAYOUT_HTML_HEADER]
+
+    match_clause = _build_clause_matcher(issue_positions)
+    issue_tooltips = _render_issue_tooltips(issue_positions)
+    # 没有任何风险点定位到文档时，逐元素/逐块的条款匹配整体跳过
+    has_issue_positions = bool(issue_positions)
+
+    # 每个版面结果只解析一次 OCR 文本元素，检测与渲染共用
+    extracted_lines = [
+        _extract_ocr_text_elements(layout_result) for layout_result in layout_results
+    ]
+    use_precise_layout = any(extracted_lines)
 
+    # 两种版面都在热循环中追加片段：绑定局部名，省去每次的属性查找
+    emit = html_parts.append
+    escape_html = _escape_html
+
+    if use_precise_layout:
+        for layout_idx, (layout_result, text_lines) in enumerate(
+            zip(layout_results, extracted_lines)
+        ):
             if not text_lines:
                 continue
 
@@ -800,21 +1313,21 @@ def generate_html_layout(json_result: Dict[str, Any], issues: List[Dict]) -> str
             pruned_result = layout_result.get("prunedResult", {})
             parsing_list = pruned_result.get("parsing_res_list", [])
             blocks_by_text = {}
-            blocks_by_bbox = []  # 存储带bbox的block，用于位置匹配
+            # 存储带bbox的block及其统一为 (x1, y1, x2, y2) 的坐标，用于位置匹配
+            blocks_by_bbox = []
+            block_boxes = []
             for block in parsing_list:
                 block_content = block.get("block_content", "").strip()
                 if block_content:
                     # 使用清理后的文本作为key
-                    block_content_clean = " ".join(block_content.split())
+                    block_content_clean = normalize_whitespace(block_content)
                     if block_content_clean:
                         blocks_by_text[block_content_clean] = block
                 # 同时存储带bbox的block用于位置匹配
                 block_bbox = block.get("block_bbox", [])
                 if block_bbox and len(block_bbox) >= 4:
-                    blocks_by_bbox.append({
-                        "block": block,
-                        "bbox": block_bbox  # [x, y, width, height] 或 [x1, y1, x2, y2]
-                    })
+                    blocks_by_bbox.append(block)
+                    block_boxes.append(_normalize_block_bbox(block_bbox))
 
             max_x = max(
                 [line["x"] + line["width"] for line in text_lines], default=A4_WIDTH_PX
@@ -841,12 +1354,12 @@ def generate_html_layout(json_result: Dict[str, Any], issues: List[Dict]) -> str
                 scale = 1.0
             min_font_size = 12.0
 
-            html_parts.append(
-                f'<div class="page-wrapper" style="width: {A4_WIDTH_PX}px; height: {A4_HEIGHT_PX}px;">'
-            )
+            emit(_LAYOUT_PAGE_WRAPPER_OPEN)
 
             # 确保文本行按 y 坐标排序（从上到下），如果 y 坐标相同则按 x 坐标排序（从左到右）
             text_lines.sort(key=lambda l: (l["y"], l["x"]))
+            bbox_matches = _match_lines_to_block_bboxes(text_lines, block_boxes, scale)
+            match_block = _build_block_text_matcher(blocks_by_text)
 
             for line_idx, line in enumerate(text_lines):
                 line_y = line["y"] * scale
@@ -854,73 +1367,18 @@ def generate_html_layout(json_result: Dict[str, Any], issues: List[Dict]) -> str
                 line_width = line["width"] * scale
                 
                 # 尝试匹配block_label
-                line_text = "".join([elem["text"] for elem in line["elements"]])
-                line_text_clean = " ".join(line_text.split())
+                line_text_clean = line["text_clean"]
                 matched_block = None
                 
-                # 首先尝试文本匹配
+                # 首先尝试文本匹配（完全匹配，其次部分匹配）
                 if line_text_clean:
-                    # 尝试完全匹配
-                    if line_text_clean in blocks_by_text:
-                        matched_block = blocks_by_text[line_text_clean]
-                    else:
-                        # 尝试部分匹配
-                        for block_text, block in blocks_by_text.items():
-                            if line_text_clean in block_text or block_text in line_text_clean:
-                                matched_block = block
-                                break
+                    matched_block = match_block(line_text_clean)
                 
-                # 如果文本匹配失败，尝试基于位置（bbox）匹配
+                # 如果文本匹配失败，使用预先批量计算的位置（bbox）匹配结果
                 # 这对于多行doc_title特别有用
-                if not matched_block:
-                    line_center_x = line_x + line_width / 2
-                    line_center_y = line_y + (line.get("height", 0) * scale) / 2
-                    
-                    for bbox_item in blocks_by_bbox:
-                        bbox = bbox_item["bbox"]
-                        block = bbox_item["block"]
-                        block_label = block.get("block_label", "")
-                        
-                        # 判断bbox格式：根据JSON，通常是 [x1, y1, x2, y2] 格式
-                        if len(bbox) >= 4:
-                            # 检查是否是 [x, y, width, height] 格式（width和height应该小于x和y的值）
-                            # 或者直接假设是 [x1, y1, x2, y2] 格式（更常见）
-                            if bbox[2] > bbox[0] and bbox[3] > bbox[1]:
-                                # [x1, y1, x2, y2] 格式
-                                x1, y1, x2, y2 = bbox[0], bbox[1], bbox[2], bbox[3]
-                            else:
-                                # [x, y, width, height] 格式
-                                x1, y1 = bbox[0], bbox[1]
-                                x2, y2 = x1 + bbox[2], y1 + bbox[3]
-                            
-                            # 缩放bbox以匹配缩放后的坐标
-                            bbox_x1 = x1 * scale
-                            bbox_y1 = y1 * scale
-                            bbox_x2 = x2 * scale
-                            bbox_y2 = y2 * scale
-                            
-                            # 检查行的中心点是否在block的bbox内，或者行与block有重叠
-                            line_x_scaled = line_x
-                            line_y_scaled = line_y
-                            line_w_scaled = line_width
-                            line_h_scaled = line.get("height", 0) * scale
-                            
-                            # 检查是否有重叠（允许一些容差）
-                            tolerance = 20 * scale
-                            if (line_center_x >= bbox_x1 - tolerance and 
-                                line_center_x <= bbox_x2 + tolerance and
-                                line_center_y >= bbox_y1 - tolerance and 
-                                line_center_y <= bbox_y2 + tolerance):
-                                matched_block = block
-                                break
-                            # 或者检查行是否与block有重叠
-                            elif not (line_x_scaled + line_w_scaled < bbox_x1 - tolerance or
-                                     line_x_scaled > bbox_x2 + tolerance or
-                                     line_y_scaled + line_h_scaled < bbox_y1 - tolerance or
-                                     line_y_scaled > bbox_y2 + tolerance):
-                                matched_block = block
-                                break
-                
+                if not matched_block and bbox_matches[line_idx] >= 0:
+                    matched_block = blocks_by_bbox[bbox_matches[line_idx]]
+
                 # 根据block_label调整字体大小
                 base_font_size = max(min_font_size, line["font_size"] * scale * 1.2)
                 if matched_block:
@@ -935,7 +1393,26 @@ def generate_html_layout(json_result: Dict[str, Any], issues: List[Dict]) -> str
                 line_font_size = base_font_size
                 line_alignment = line["alignment"]
 
-                line_content_parts = []
+                text_align = "left"
+                if line_alignment == "center":
+                    text_align = "center"
+                elif line_alignment == "right":
+                    text_align = "right"
+
+                font_category, _ = _classify_font_size(line_font_size)
+                if font_category == "大":
+                    tag = "h2"
+                elif font_category == "中":
+                    tag = "h3"
+                else:
+                    tag = "div"
+
+                # 调整样式，减小行间距，增大字体
+                style = f"left: {line_x}px; top: {line_y}px; font-size: {line_font_size}px; text-align: {text_align}; width: {line_width}px; position: absolute; line-height: 1.0; margin: 0; padding: 0;"
+
+                # 行内元素直接写入 html_parts，不再为每行拼接中间字符串
+                emit(f'<{tag} class="text-element" style="{style}">')
+
                 elem_global_idx = 0
                 prev_elem_end_x = None
 
@@ -945,8 +1422,6 @@ def generate_html_layout(json_result: Dict[str, Any], issues: List[Dict]) -> str
                     elem_width = elem["width"] * scale
                     elem_end_x = elem_x + elem_width
 
-                    relative_x = elem_x - line_x
-
                     spacing = ""
                     if prev_elem_end_x is not None and elem_x > prev_elem_end_x:
                         gap = elem_x - prev_elem_end_x
@@ -955,75 +1430,34 @@ def generate_html_layout(json_result: Dict[str, Any], issues: List[Dict]) -> str
                         else:
                             spacing = " "
 
-                    text_clean = " ".join(text.split())
+                    text_clean = elem["text_clean"]
                     matching_issue = None
                     matching_issue_idx = None
 
-                    if len(text_clean) > 3:
-                        for issue_idx, issue_data in issue_positions.items():
-                            clause_text = issue_data["issue"].get("条款", "")
-                            if clause_text:
-                                clause_clean = " ".join(clause_text.split())
-                                if text_clean in clause_clean:
-                                    matching_issue = issue_data["issue"]
-                                    matching_issue_idx = issue_idx
-                                    break
-
-                    escaped_text = _escape_html(text)
-                    if matching_issue:
-                        risk_level = matching_issue.get("风险等级", "低")
-                        risk_class = {
-                            "高": "risk-highlight risk-high",
-                            "中": "risk-highlight risk-medium",
-                            "低": "risk-highlight risk-low",
-                        }.get(risk_level, "risk-highlight risk-low")
-
-                        issue_type = matching_issue.get("类型", "")
-                        issue_desc = matching_issue.get("问题描述", "")
-                        issue_suggestion = matching_issue.get("修改建议", "")
+                    if has_issue_positions and len(text_clean) > 3:
+                        matched = match_clause(text_clean)
+                        if matched:
+                            matching_issue_idx, matching_issue = matched
 
+                    escaped_text = escape_html(text)
+                    if matching_issue:
+                        risk_class, tooltip_body = issue_tooltips[matching_issue_idx]
                         tooltip_id = f"tooltip_{layout_idx}_{line_idx}_{elem_global_idx}_{matching_issue_idx}"
 
-                        line_content_parts.append(
-                            f'{spacing}<span class="{risk_class}" data-issue-idx="{matching_issue_idx}" onmouseenter="showTooltip(event, \'{tooltip_id}\')" onmouseleave="hideTooltip(\'{tooltip_id}\')">{escaped_text}<div id="{tooltip_id}" class="risk-tooltip"><h4>{_escape_html(issue_type)}</h4><p><strong>风险等级：</strong>{risk_level}</p><p><strong>问题描述：</strong>{_escape_html(issue_desc)}</p><p><strong>修改建议：</strong>{_escape_html(issue_suggestion)}</p></div></span>'
+                        emit(
+                            f'{spacing}<span class="{risk_class}" data-issue-idx="{matching_issue_idx}" onmouseenter="showTooltip(event, \'{tooltip_id}\')" onmouseleave="hideTooltip(\'{tooltip_id}\')">{escaped_text}<div id="{tooltip_id}" class="risk-tooltip">{tooltip_body}'
                         )
                     else:
-                        line_content_parts.append(
+                        emit(
                             f'{spacing}<span style="display: inline;">{escaped_text}</span>'
                         )
 
                     prev_elem_end_x = elem_end_x
                     elem_global_idx += 1
 
-                line_content = "".join(line_content_parts)
-
-                text_align = "left"
-                if line_alignment == "center":
-                    text_align = "center"
-                elif line_alignment == "right":
-                    text_align = "right"
-
-                font_category, _ = _classify_font_size(line_font_size)
-                if font_category == "大":
-                    tag = "h2"
-                elif font_category == "中":
-                    tag = "h3"
-                else:
-                    tag = "div"
-
-                # 调整样式，减小行间距，增大字体
-                style = f"left: {line_x}px; top: {line_y}px; font-size: {line_font_size}px; text-align: {text_align}; width: {line_width}px; position: absolute; line-height: 1.0; margin: 0; padding: 0;"
-
-                if tag in ["h2", "h3"]:
-                    html_parts.append(
-                        f'<{tag} class="text-element" style="{style}">{line_content}</{tag}>'
-                    )
-                else:
-                    html_parts.append(
-                        f'<div class="text-element" style="{style}">{line_content}</div>'
-                    )
+                emit(f"</{tag}>")
 
-            html_parts.append("</div>")
+            emit("</div>")
     else:
         for layout_idx, layout_result in enumerate(layout_results):
             pruned_result = layout_result.get("prunedResult", {})
@@ -1055,103 +1489,40 @@ def generate_html_layout(json_result: Dict[str, Any], issues: List[Dict]) -> str
                     else:
                         base_font_size = 14.0
 
-                block_content_clean = " ".join(block_content.split())
+                block_content_clean = normalize_whitespace(block_content)
 
                 matching_issue = None
                 matching_issue_idx = None
 
-                if len(block_content_clean) > 3:
-                    for issue_idx, issue_data in issue_positions.items():
-                        clause_text = issue_data["issue"].get("条款", "")
-                        if clause_text:
-                            clause_clean = " ".join(clause_text.split())
-                            if block_content_clean in clause_clean:
-                                matching_issue = issue_data["issue"]
-                                matching_issue_idx = issue_idx
-                                break
+                if has_issue_positions and len(block_content_clean) > 3:
+                    matched = match_clause(block_content_clean)
+                    if matched:
+                        matching_issue_idx, matching_issue = matched
 
                 escaped_content = _escape_html(block_content)
 
                 if matching_issue:
-                    risk_level = matching_issue.get("风险等级", "低")
-                    risk_class = {
-                        "高": "risk-highlight risk-high",
-                        "中": "risk-highlight risk-medium",
-                        "低": "risk-highlight risk-low",
-                    }.get(risk_level, "risk-highlight risk-low")
-
-                    issue_type = matching_issue.get("类型", "")
-                    issue_desc = matching_issue.get("问题描述", "")
-                    issue_suggestion = matching_issue.get("修改建议", "")
-
+                    risk_class, tooltip_body = issue_tooltips[matching_issue_idx]
                     tooltip_id = f"tooltip_{layout_idx}_{block.get('block_id')}_{matching_issue_idx}"
 
-                    html_content = f'<span class="{risk_class}" data-issue-idx="{matching_issue_idx}" onmouseenter="showTooltip(event, \'{tooltip_id}\')" onmouseleave="hideTooltip(\'{tooltip_id}\')">{escaped_content}<div id="{tooltip_id}" class="risk-tooltip"><h4>{_escape_html(issue_type)}</h4><p><strong>风险等级：</strong>{risk_level}</p><p><strong>问题描述：</strong>{_escape_html(issue_desc)}</p><p><strong>修改建议：</strong>{_escape_html(issue_suggestion)}</p></div></span>'
+                    html_content = f'<span class="{risk_class}" data-issue-idx="{matching_issue_idx}" onmouseenter="showTooltip(event, \'{tooltip_id}\')" onmouseleave="hideTooltip(\'{tooltip_id}\')">{escaped_content}<div id="{tooltip_id}" class="risk-tooltip">{tooltip_body}'
                 else:
                     html_content = escaped_content
 
                 if block_label == "doc_title":
-                    html_parts.append(
+                    emit(
                         f'<h1 style="text-align: center; margin: 15px 0; font-size: {base_font_size}px; line-height: 1.2;">{html_content}</h1>'
                     )
                 elif block_label == "paragraph_title":
-                    html_parts.append(
+                    emit(
                         f'<h2 style="margin: 10px 0 5px 0; font-size: {base_font_size}px; line-height: 1.2;">{html_content}</h2>'
                     )
                 else:
-                    html_parts.append(
+                    emit(
                         f'<div class="text-block" style="font-size: {base_font_size}px; line-height: 1.2;">{html_content}</div>'
                     )
 
-    html_parts.append(
-        """
-    <script>
-        // 确保函数在全局作用域中定义
-        window.showTooltip = function(event, tooltipId) {
-            const tooltip = document.getElementById(tooltipId);
-            if (tooltip) {
-                tooltip.classList.add('show');
-                const rect = event.target.getBoundingClientRect();
-                const tooltipRect = tooltip.getBoundingClientRect();
-                
-                // 默认显示在右侧，并垂直居中
-                let left = rect.right + 15; // 15px 偏移量
-                let top = rect.top + rect.height / 2 - tooltipRect.height / 2;
-
-                // 如果右侧空间不足，则显示在左侧
-                if (left + tooltipRect.width > window.innerWidth - 15) {
-                    left = rect.left - tooltipRect.width - 15;
-                }
-
-                // 左侧边界检查
-                if (left < 15) {
-                    left = 15;
-                }
-
-                // 上下边界检查
-                if (top < 15) {
-                    top = 15;
-                }
-                if (top + tooltipRect.height > window.innerHeight - 15) {
-                    top = window.innerHeight - tooltipRect.height - 15;
-                }
-                
-                tooltip.style.left = left + 'px';
-                tooltip.style.top = top + 'px';
-            }
-        };
-        
-        window.hideTooltip = function(tooltipId) {
-            const tooltip = document.getElementById(tooltipId);
-            if (tooltip) {
-                tooltip.classList.remove('show');
-            }
-        };
-        
-    </script>
-    </div>
-    """
-    )
+    html_parts.append(_LAYOUT_HTML_FOOTER)
 
     return "".join(html_parts)
 
@@ -1160,15 +1531,7 @@ def _escape_html(text: str) -> str:
     """转义HTML特殊字符并处理换行"""
     if not text:
         return ""
-    escaped = (
-        text.replace("&", "&amp;")
-        .replace("<", "&lt;")
-        .replace(">", "&gt;")
-        .replace('"', "&quot;")
-        .replace("'", "&#39;")
-    )
-    escaped = escaped.replace("\n", "<br>")
-    return escaped
+    return text.translate(_HTML_ESCAPE_TABLE)
 
 
 def filter_issues_by_risk(issues: List[Dict], risk_level: str) -> List[Dict]:
@@ -1176,9 +1539,7 @@ def filter_issues_by_risk(issues: List[Dict], risk_level: str) -> List[Dict]:
     if risk_level == "全部":
         return issues
 
-    level_mapping = {"重大风险": "高", "一般风险": "中", "低风险": "低"}
-
-    target_level = level_mapping.get(risk_level, "低")
+    target_level = _RISK_LABEL_TO_LEVEL.get(risk_level, "低")
     return [issue for issue in issues if issue.get("风险等级") == target_level]
 
 
@@ -1209,23 +1570,22 @@ def render_risk_analysis(risk_analysis: Dict[str, Any]):
     with col1:
         st.metric("风险评分", f"{risk_score}/100")
     with col2:
-        level_color = {"高": "🔴", "中": "🟡", "低": "🟢"}.get(risk_level, "⚪")
+        level_color = RISK_LEVEL_ICONS.get(risk_level, "⚪")
         st.metric("风险等级", f"{level_color} {risk_level}")
 
     # 问题详情
     if all_issues:
         st.markdown("### 📋 问题详情")
 
-        # 按风险等级分类
-        high_risk_issues = [
-            issue for issue in all_issues if issue.get("风险等级") == "高"
-        ]
-        medium_risk_issues = [
-            issue for issue in all_issues if issue.get("风险等级") == "中"
-        ]
-        low_risk_issues = [
-            issue for issue in all_issues if issue.get("风险等级") == "低"
-        ]
+        # 按风险等级分类（单次遍历）
+        issues_by_level: Dict[str, List[Dict]] = {"高": [], "中": [], "低": []}
+        for issue in all_issues:
+            bucket = issues_by_level.get(issue.get("风险等级"))
+            if bucket is not None:
+                bucket.append(issue)
+        high_risk_issues = issues_by_level["高"]
+        medium_risk_issues = issues_by_level["中"]
+        low_risk_issues = issues_by_level["低"]
 
         # 显示高风险问题
         if high_risk_issues:
@@ -1330,24 +1690,66 @@ def render_suggestions(suggestions: Dict[str, Any]):
             st.write(f"• {measure}")
 
 
+def _split_markdown_tiles(markdown_text: str, tile_chars: int = MARKDOWN_TILE_CHARS) -> List[str]:
+    """在顶层标题前（代码块之外）将Markdown切分为约 tile_chars 字符的块
+
+    各块单独渲染：含引用式链接、脚注或缩写定义的文档不切分，否则定义与引用可能落在不同块中。
+    """
+    if len(markdown_text) <= tile_chars or _MARKDOWN_DEFINITION_RE.search(markdown_text):
+        return [markdown_text]
+
+    tiles = []
+    current: List[str] = []
+    current_len = 0
+    in_fence = False
+    for line in markdown_text.split("\n"):
+        stripped = line.lstrip()
+        if stripped.startswith(("```", "~~~")):
+            in_fence = not in_fence
+        elif (
+            not in_fence
+            and current_len >= tile_chars
+            and _MARKDOWN_HEADING_RE.match(line)
+        ):
+            tiles.append("\n".join(current))
+            current = []
+            current_len = 0
+        current.append(line)
+        current_len += len(line) + 1
+    if current:
+        tiles.append("\n".join(current))
+    return tiles
+
+
+@lru_cache(maxsize=64)
+def _render_markdown_html(markdown_text: str) -> str:
+    """将Markdown分块转换为HTML；结果按文本缓存，切换标签页等 rerun 时直接复用"""
+    tiles = _split_markdown_tiles(markdown_text)
+    try:
+        if _mistune_markdown is not None:
+            tile_bodies = [_mistune_markdown(tile) for tile in tiles]
+        else:
+            import markdown as md_lib
+
+            converter = md_lib.Markdown(
+                extensions=["extra", "codehilite", "tables", "fenced_code"],
+            )
+            tile_bodies = [converter.reset().convert(tile) for tile in tiles]
+    except Exception:
+        tile_bodies = [html.escape(tile).replace("\n", "<br>") for tile in tiles]
+
+    if len(tile_bodies) == 1:
+        return tile_bodies[0]
+    return "".join(f'<section class="md-tile">{body}</section>' for body in tile_bodies)
+
+
 def render_markdown_box(markdown_text: str, height: int = 780, enable_scroll: bool = True):
     """将Markdown内容渲染在框中，支持复制"""
     if not markdown_text:
         st.info("暂无内容")
         return
 
-    try:
-        import markdown as md_lib
-
-        html_body = md_lib.markdown(
-            markdown_text,
-            extensions=["extra", "codehilite", "tables", "fenced_code"],
-        )
-    except Exception:
-        import html as html_escape
-
-        escaped = html_escape.escape(markdown_text)
-        html_body = escaped.replace("\n", "<br>")
+    html_body = _render_markdown_html(markdown_text)
 
     if enable_scroll:
         overflow_style = "overflow-y: auto; overflow-x: auto;"
@@ -1407,6 +1809,10 @@ def render_markdown_box(markdown_text: str, height: int = 780, enable_scroll: bo
         background-color: #f2f4f7;
         font-weight: 600;
     }}
+    .md-preview-box .md-tile {{
+        content-visibility: auto;
+        contain-intrinsic-size: auto 1200px;
+    }}
     </style>
     <div class="md-preview-box">{html_body}</div>
     """
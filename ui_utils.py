@@ -2,21 +2,54 @@
 
 import os
 import re
+import base64
 import json
+import codecs
+import importlib.util
+import mmap
+import shutil
+import sqlite3
 import tempfile
+import threading
 import streamlit as st
-from typing import Dict, List, Optional, Any, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from http.cookiejar import DefaultCookiePolicy
+from io import StringIO
+from typing import Any, Callable, Dict, List, Optional, Tuple
 import hashlib
+import requests
+from requests.adapters import HTTPAdapter
 from datetime import datetime
 
+# orjson 为可选依赖：存在时用于体积较大的 OCR/分析结果 JSON 编解码
+if importlib.util.find_spec("orjson"):
+    orjson = importlib.import_module("orjson")
+else:  # pragma: no cover - 兼容未安装依赖的情况
+    orjson = None
 
-def compute_file_md5(file_path: str, chunk_size: int = 1024 * 1024) -> Optional[str]:
+# pybase64 为可选依赖，提供 SIMD 加速的 base64 编码，接口与标准库一致
+if importlib.util.find_spec("pybase64"):
+    b64encode = importlib.import_module("pybase64").b64encode
+else:  # pragma: no cover - 兼容未安装依赖的情况
+    b64encode = base64.b64encode
+
+# charset_normalizer（requests 的依赖）用于常见中文编码都无法解码的文本文件
+if importlib.util.find_spec("charset_normalizer"):
+    charset_normalizer = importlib.import_module("charset_normalizer")
+else:  # pragma: no cover - 兼容未安装依赖的情况
+    charset_normalizer = None
+
+
+def compute_file_md5(file_path: str) -> Optional[str]:
     """
     计算文件内容的 MD5 值。
 
+    非空普通文件通过内存映射整体交给 hashlib，无 Python 层分块循环与额外拷贝；
+    空文件或无法映射的文件由 hashlib.file_digest 读取。
+
     Args:
         file_path: 文件路径
-        chunk_size: 读取块大小，默认 1MB
 
     Returns:
         32 位十六进制 MD5 字符串，若文件不存在或读取失败则返回 None
@@ -25,70 +58,363 @@ def compute_file_md5(file_path: str, chunk_size: int = 1024 * 1024) -> Optional[
         return None
 
     try:
-        if not os.path.exists(file_path):
-            return None
-
-        md5 = hashlib.md5()
         with open(file_path, "rb") as f:
-            while True:
-                chunk = f.read(chunk_size)
-                if not chunk:
-                    break
-                md5.update(chunk)
-        return md5.hexdigest()
+            if os.fstat(f.fileno()).st_size:
+                try:
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                        if hasattr(mm, "madvise") and hasattr(mmap, "MADV_SEQUENTIAL"):
+                            mm.madvise(mmap.MADV_SEQUENTIAL)
+                        return hashlib.md5(mm).hexdigest()
+                except (OSError, ValueError):
+                    pass
+            if hasattr(hashlib, "file_digest"):
+                return hashlib.file_digest(f, "md5").hexdigest()
+            return hashlib.md5(f.read()).hexdigest()  # Python 3.10 无 file_digest
     except Exception:
         return None
 
 
+def dumps_json_bytes(obj: Any) -> bytes:
+    """序列化为 2 空格缩进的 UTF-8 JSON 字节，优先使用 orjson"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(
+                obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS
+            )
+        except orjson.JSONEncodeError:
+            pass
+    return json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8")
+
+
+def dumps_json_sorted(obj: Any) -> bytes:
+    """序列化为键有序的紧凑 JSON 字节，用于计算内容摘要；无法序列化的值按 str 处理"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(
+                obj,
+                default=str,
+                option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS,
+            )
+        except orjson.JSONEncodeError:
+            pass
+    return json.dumps(obj, ensure_ascii=False, sort_keys=True, default=str).encode(
+        "utf-8"
+    )
+
+
+def write_bytes_atomic(path: str, data: bytes):
+    """先写入同目录临时文件再 os.replace，读者只会看到完整的旧文件或新文件"""
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def loads_json(data: Any) -> Any:
+    """解析 JSON 字节或字符串，优先使用 orjson"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+@lru_cache(maxsize=256)
+def _file_md5_by_fingerprint(file_path: str, mtime_ns: int, size: int) -> Optional[str]:
+    """按 (路径, 修改时间, 大小) 缓存 MD5；mtime_ns/size 仅作为缓存键"""
+    return compute_file_md5(file_path)
+
+
+# 写入文件时顺带算出的 MD5，按 (路径, 修改时间, 大小) 登记，之后查询无需再读取文件
+_KNOWN_FILE_MD5_LIMIT = 256
+_known_file_md5: Dict[Tuple[str, int, int], str] = {}
+
+
+def _remember_file_md5(file_path: str, md5_hex: str):
+    """登记刚写入文件的 MD5，文件指纹以写入完成后的状态为准"""
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return
+    if len(_known_file_md5) >= _KNOWN_FILE_MD5_LIMIT:
+        _known_file_md5.clear()
+    _known_file_md5[(file_path, stat.st_mtime_ns, stat.st_size)] = md5_hex
+
+
+def get_file_md5_cached(file_path: str) -> Optional[str]:
+    """获取文件 MD5，文件指纹未变化时直接复用上次结果而不重新读取文件"""
+    if not file_path:
+        return None
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    known = _known_file_md5.get((file_path, stat.st_mtime_ns, stat.st_size))
+    if known:
+        return known
+    return _file_md5_by_fingerprint(file_path, stat.st_mtime_ns, stat.st_size)
+
+
+@st.cache_resource(show_spinner=False)
+def get_http_session() -> requests.Session:
+    """获取跨 rerun/会话复用的 HTTP 会话，保持连接池不随脚本重跑而重建
+
+    该会话由所有用户会话与后台线程共享，因此拒绝保存任何 Cookie，避免服务端下发的
+    Cookie 在不同用户之间串用（OCR 接口与 MCP 服务均不依赖 Cookie）。
+    """
+    session = requests.Session()
+    session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+    adapter = HTTPAdapter(pool_connections=16, pool_maxsize=32)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+# 缺失时写入的 session state 默认值
+_SESSION_STATE_DEFAULTS: Dict[str, Any] = {
+    "workflow_result": None,
+    "processing_status": "idle",  # idle, processing, completed, error
+    "file_name": None,
+    "preview_content": None,
+    "loaded_from_history": False,
+    # 用于右侧对照面板的在线解析结果缓存
+    "ocr_parse_result": None,
+    # 记录上次OCR解析的文件路径，用于检查文件是否切换
+    "ocr_parsed_file_path": None,
+    # 记录上次OCR解析对应的原始文件名，便于比较
+    "ocr_parsed_original_file_name": None,
+    # 记录上次OCR解析对应的文件内容哈希，优先用于判断是否同一文件
+    "ocr_parsed_file_hash": None,
+    # preview: 预览界面；analysis: 分析结果界面
+    "view_mode": "preview",
+    "skip_uploaded_file_once": False,
+    "file_hash": None,
+    "last_processed_upload_name": None,
+    "last_processed_upload_size": None,
+}
+
+# 缺失或为空时从环境变量补全的配置项：(键, 环境变量, 默认值)
+_SESSION_STATE_ENV_DEFAULTS = (
+    ("llm_api_base_url", "LLM_API_BASE_URL", ""),
+    ("llm_api_key", "LLM_API_KEY", ""),
+    ("llm_model_name", "LLM_MODEL_NAME", "ernie-4.5-turbo-128k"),
+    ("ocr_api_url", "OCR_API_URL", ""),
+    ("ocr_api_token", "OCR_API_TOKEN", ""),
+)
+
+
 def initialize_session_state():
-    """初始化session state"""
-    if "workflow_result" not in st.session_state:
-        st.session_state.workflow_result = None
-    if "processing_status" not in st.session_state:
-        st.session_state.processing_status = (
-            "idle"  # idle, processing, completed, error
-        )
-    if "file_name" not in st.session_state:
-        st.session_state.file_name = None
-    if "preview_content" not in st.session_state:
-        st.session_state.preview_content = None
-    if "loaded_from_history" not in st.session_state:
-        st.session_state.loaded_from_history = False
-    if "ocr_parse_result" not in st.session_state:
-        # 用于右侧对照面板的在线解析结果缓存
-        st.session_state.ocr_parse_result = None
-    if "ocr_parsed_file_path" not in st.session_state:
-        # 记录上次OCR解析的文件路径，用于检查文件是否切换
-        st.session_state.ocr_parsed_file_path = None
-    if "ocr_parsed_original_file_name" not in st.session_state:
-        # 记录上次OCR解析对应的原始文件名，便于比较
-        st.session_state.ocr_parsed_original_file_name = None
-    if "ocr_parsed_file_hash" not in st.session_state:
-        # 记录上次OCR解析对应的文件内容哈希，优先用于判断是否同一文件
-        st.session_state.ocr_parsed_file_hash = None
-    if "view_mode" not in st.session_state:
-        # preview: 预览界面；analysis: 分析结果界面
-        st.session_state.view_mode = "preview"
-    if "llm_api_base_url" not in st.session_state or not st.session_state.llm_api_base_url:
-        st.session_state.llm_api_base_url = os.getenv("LLM_API_BASE_URL", "")
-    if "llm_api_key" not in st.session_state or not st.session_state.llm_api_key:
-        st.session_state.llm_api_key = os.getenv("LLM_API_KEY", "")
-    if "llm_model_name" not in st.session_state or not st.session_state.llm_model_name:
-        st.session_state.llm_model_name = os.getenv(
-            "LLM_MODEL_NAME", "ernie-4.5-turbo-128k"
-        )
-    if "ocr_api_url" not in st.session_state or not st.session_state.ocr_api_url:
-        st.session_state.ocr_api_url = os.getenv("OCR_API_URL", "")
-    if "ocr_api_token" not in st.session_state or not st.session_state.ocr_api_token:
-        st.session_state.ocr_api_token = os.getenv("OCR_API_TOKEN", "")
-    if "skip_uploaded_file_once" not in st.session_state:
-        st.session_state.skip_uploaded_file_once = False
-    if "file_hash" not in st.session_state:
-        st.session_state.file_hash = None
-    if "last_processed_upload_name" not in st.session_state:
-        st.session_state.last_processed_upload_name = None
-    if "last_processed_upload_size" not in st.session_state:
-        st.session_state.last_processed_upload_size = None
+    """初始化session state
+
+    每次 rerun 只读取一次现有状态，缺失项合并为一次 update 写入。
+    """
+    state = st.session_state
+    missing = {
+        key: value for key, value in _SESSION_STATE_DEFAULTS.items() if key not in state
+    }
+    for key, env_name, default in _SESSION_STATE_ENV_DEFAULTS:
+        if not state.get(key):
+            missing[key] = os.getenv(env_name, default)
+    if missing:
+        state.update(missing)
+
+
+RESULTS_DIR = "contract_analysis_results"
+# 结果文件较多时（如首次建立索引）并行读取解析
+RESULT_SCAN_WORKERS = min(8, (os.cpu_count() or 1) * 2)
+RESULT_SCAN_PARALLEL_MIN = 8
+# 结果目录的 SQLite 索引：(文件, 内容哈希, 时间戳)，查询时按目录文件列表增量同步
+RESULTS_INDEX_PATH = os.path.join(RESULTS_DIR, ".index.sqlite")
+# 结果文件按 2 空格缩进写出：file_content_hash 位于开头，processing_time 是最后一个键，
+# 只读取首尾两段即可取得这两个顶层字段，无需解析中间体积较大的文档正文
+RESULT_PEEK_SIZE = 4096
+_RESULT_HASH_RE = re.compile(rb'\n  "file_content_hash": "([0-9a-fA-F]+)"')
+_RESULT_TS_RE = re.compile(rb'\n  "processing_time": ([0-9.eE+-]+)\n}\s*$')
+
+
+def _result_name_timestamp(path: str) -> float:
+    """从形如 contract_analysis_YYYYmmdd_HHMMSS.json 的文件名中解析时间戳"""
+    base = os.path.basename(path)
+    try:
+        stem = os.path.splitext(base)[0]
+        parts = stem.split("_")
+        if len(parts) >= 3:
+            dt = parts[-2] + parts[-1]  # YYYYmmdd + HHMMSS
+            # 定长数字直接切片取值，比 strptime 按格式串解析快得多
+            if len(dt) == 14 and dt.isdigit():
+                return datetime(
+                    int(dt[:4]),
+                    int(dt[4:6]),
+                    int(dt[6:8]),
+                    int(dt[8:10]),
+                    int(dt[10:12]),
+                    int(dt[12:14]),
+                ).timestamp()
+    except Exception:
+        pass
+    return 0.0
+
+
+def _result_timestamp(data: Dict[str, Any], path: str) -> float:
+    """以 processing_time 为主，退化到文件名时间戳"""
+    ts = data.get("processing_time")
+    if isinstance(ts, (int, float)) and ts:
+        return float(ts)
+    return _result_name_timestamp(path) or 0.0
+
+
+def _open_results_index() -> sqlite3.Connection:
+    conn = sqlite3.connect(
+        RESULTS_INDEX_PATH, timeout=5, isolation_level=None, check_same_thread=False
+    )
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS results("
+        "path TEXT PRIMARY KEY, hash TEXT, ts REAL, mtime_ns INTEGER)"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_hash_ts ON results(hash, ts DESC)")
+    return conn
+
+
+def _map_result_files(func: Callable[[str], Any], paths: List[str]) -> List[Any]:
+    """对结果文件逐个执行 func；文件较多时用线程池并行读取（文件读取期间释放 GIL）"""
+    if len(paths) < RESULT_SCAN_PARALLEL_MIN:
+        return [func(path) for path in paths]
+    with ThreadPoolExecutor(max_workers=RESULT_SCAN_WORKERS) as pool:
+        return list(pool.map(func, paths))
+
+
+def _peek_result_fields(path: str) -> Optional[Tuple[str, float]]:
+    """仅读取结果文件首尾两段提取 (内容哈希, 时间戳)；格式不符时返回 None"""
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size <= 2 * RESULT_PEEK_SIZE:
+            return None
+        head = f.read(RESULT_PEEK_SIZE)
+        f.seek(size - RESULT_PEEK_SIZE)
+        tail = f.read()
+    hash_match = _RESULT_HASH_RE.search(head)
+    ts_match = _RESULT_TS_RE.search(tail)
+    if not hash_match or not ts_match:
+        return None
+    try:
+        ts = float(ts_match.group(1))
+    except ValueError:
+        return None
+    return hash_match.group(1).decode("ascii"), ts or _result_name_timestamp(path)
+
+
+def _inspect_result_file(path: str) -> Tuple[Optional[str], float]:
+    """读取结果文件的 (内容哈希, 时间戳)；无法解析时哈希为 None"""
+    try:
+        peeked = _peek_result_fields(path)
+        if peeked is not None:
+            return peeked
+        with open(path, "rb") as f:
+            data = loads_json(f.read())
+        saved_hash = data.get("file_content_hash")
+        content_hash = saved_hash if isinstance(saved_hash, str) else None
+        return content_hash, _result_timestamp(data, path)
+    except Exception:
+        return None, 0.0
+
+
+def _sync_results_index(conn: sqlite3.Connection, results_dir: str):
+    """只解析新增或修改过的结果文件，并清除已删除文件的索引"""
+    indexed = dict(conn.execute("SELECT path, mtime_ns FROM results"))
+    rows = []
+    seen = set()
+    with os.scandir(results_dir) as entries:
+        result_entries = [
+            entry
+            for entry in entries
+            if entry.name.lower().endswith(".json") and entry.is_file()
+        ]
+    pending = []
+    for entry in result_entries:
+        seen.add(entry.path)
+        mtime_ns = entry.stat().st_mtime_ns
+        if indexed.get(entry.path) != mtime_ns:
+            pending.append((entry.path, mtime_ns))
+
+    inspected = _map_result_files(_inspect_result_file, [path for path, _ in pending])
+    for (path, mtime_ns), (content_hash, ts) in zip(pending, inspected):
+        rows.append((path, content_hash, ts, mtime_ns))
+
+    removed = [(path,) for path in indexed if path not in seen]
+    if rows or removed:
+        with conn:
+            conn.execute("BEGIN")
+            conn.executemany("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)", rows)
+            conn.executemany("DELETE FROM results WHERE path = ?", removed)
+
+
+def _load_latest_result_indexed(
+    results_dir: str, content_hash: str
+) -> Optional[Dict[str, Any]]:
+    conn = _open_results_index()
+    try:
+        _sync_results_index(conn, results_dir)
+        paths = [
+            row[0]
+            for row in conn.execute(
+                "SELECT path FROM results WHERE hash = ? ORDER BY ts DESC",
+                (content_hash,),
+            )
+        ]
+    finally:
+        conn.close()
+
+    for path in paths:
+        try:
+            with open(path, "rb") as f:
+                data = loads_json(f.read())
+        except Exception:
+            continue
+        if data.get("file_content_hash") == content_hash:
+            return data
+    return None
+
+
+def _scan_latest_result(results_dir: str, content_hash: str) -> Optional[Dict[str, Any]]:
+    """逐个扫描结果文件查找最新结果（索引不可用时的回退路径）"""
+    # 内容哈希在结果文件中以 JSON 字符串出现；原始字节中不含该串的文件无需解析
+    hash_needle = f'"{content_hash}"'.encode("utf-8")
+
+    def read_candidate(fpath: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(fpath, "rb") as f:
+                raw = f.read()
+            if hash_needle not in raw:
+                return None
+            data = loads_json(raw)
+            saved_content_hash = data.get("file_content_hash")
+            if isinstance(saved_content_hash, str) and saved_content_hash == content_hash:
+                return {"_ts": _result_timestamp(data, fpath), "_path": fpath, "data": data}
+        except Exception:
+            pass
+        return None
+
+    with os.scandir(results_dir) as entries:
+        result_paths = [
+            entry.path for entry in entries if entry.name.lower().endswith(".json")
+        ]
+    candidates = [
+        candidate
+        for candidate in _map_result_files(read_candidate, result_paths)
+        if candidate is not None
+    ]
+
+    if not candidates:
+        return None
+
+    candidates.sort(key=lambda x: x["_ts"], reverse=True)
+    return candidates[0]["data"]
 
 
 def load_latest_result_by_filename(
@@ -100,80 +426,52 @@ def load_latest_result_by_filename(
 
     参数中的 file_name 保留向后兼容，但匹配完全依赖 file_hash。
     """
-    results_dir = "contract_analysis_results"
+    results_dir = RESULTS_DIR
     if not os.path.exists(results_dir):
         return None
 
     content_hash = file_hash
     if not content_hash and file_path:
-        content_hash = compute_file_md5(file_path)
+        content_hash = get_file_md5_cached(file_path)
 
     if not content_hash:
         return None
 
-    candidates: List[Dict[str, Any]] = []
-    for fname in os.listdir(results_dir):
-        if not fname.lower().endswith(".json"):
-            continue
-        fpath = os.path.join(results_dir, fname)
-        try:
-            with open(fpath, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            # 匹配逻辑
-            match = False
-            saved_content_hash = data.get("file_content_hash")
-            if isinstance(saved_content_hash, str) and saved_content_hash == content_hash:
-                match = True
-
-            if match:
-                # 以 processing_time 为主，退化到文件名时间戳排序
-                ts = data.get("processing_time")
-                candidates.append(
-                    {
-                        "_ts": float(ts) if isinstance(ts, (int, float)) else 0.0,
-                        "_path": fpath,
-                        "data": data,
-                    }
-                )
-        except Exception:
-            continue
-
-    if not candidates:
-        return None
-
-    def extract_name_ts(p: str) -> float:
-        base = os.path.basename(p)
-        # 形如 contract_analysis_YYYYmmdd_HHMMSS.json
-        try:
-            stem = os.path.splitext(base)[0]
-            parts = stem.split("_")
-            if len(parts) >= 3:
-                dt = parts[-2] + parts[-1]  # YYYYmmdd + HHMMSS
-                # 转换为结构化时间
-                import datetime
-
-                d = datetime.datetime.strptime(dt, "%Y%m%d%H%M%S")
-                return d.timestamp()
-        except Exception:
-            pass
-        return 0.0
-
-    for c in candidates:
-        if not c["_ts"]:
-            c["_ts"] = extract_name_ts(c["_path"]) or 0.0
-
-    candidates.sort(key=lambda x: x["_ts"], reverse=True)
-    return candidates[0]["data"]
+    try:
+        return _load_latest_result_indexed(results_dir, content_hash)
+    except sqlite3.Error as e:
+        print(f"结果索引不可用，回退为目录扫描: {e}")
+        return _scan_latest_result(results_dir, content_hash)
 
 
 SUPPORTED_FILE_EXTENSIONS = (".pdf", ".docx", ".txt", ".doc")
 UPLOADED_DIR = "uploaded_contracts"
+SAMPLE_DIR = "contracts"
+PREVIEW_MAX_CHARS = 2000
+COPY_CHUNK_SIZE = 1024 * 1024
+# gb2312 是 gbk 的子集，gbk 解码失败时 gb2312 必然失败，故不再单独尝试
+TXT_ENCODINGS = ("utf-8", "gbk", "gb18030")
+# 带 BOM 的文本直接确定编码（BOM 由对应编解码器去除）
+TXT_BOM_ENCODINGS = (
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+# 预览只需前 PREVIEW_MAX_CHARS+1 个字符；上述编码单个字符最多 4 字节，读取这些字节即可
+TXT_PREVIEW_MAX_BYTES = (PREVIEW_MAX_CHARS + 1) * 4
+# PyMuPDF 不支持多线程并发调用，所有 fitz 操作（预览取文本、页面渲染）共用此锁串行化
+fitz_lock = threading.Lock()
+
+
+# 文件名（上传文件、缓存文件）中需替换为下划线的字符，以及需要合并的连续下划线
+_UNSAFE_NAME_CHARS_RE = re.compile(r"[^\w\u4e00-\u9fff-]")
+_UNDERSCORE_RUN_RE = re.compile(r"_+")
 
 
 def _sanitize_filename(name: str) -> str:
     """清理文件名，仅保留字母数字、下划线、连字符以及中文字符。"""
-    cleaned = re.sub(r"[^\w\u4e00-\u9fff-]", "_", name)
-    cleaned = re.sub(r"_+", "_", cleaned).strip("_")
+    cleaned = _UNSAFE_NAME_CHARS_RE.sub("_", name)
+    cleaned = _UNDERSCORE_RUN_RE.sub("_", cleaned).strip("_")
     return cleaned or "uploaded_file"
 
 
@@ -202,50 +500,83 @@ def save_uploaded_file(uploaded_file) -> Optional[str]:
     file_path = _ensure_unique_file_path(safe_base, suffix)
 
     try:
+        # 写入的同时计算 MD5，省去再读一遍
+        md5 = hashlib.md5()
         with open(file_path, "wb") as f:
-            f.write(uploaded_file.read())
+            getbuffer = getattr(uploaded_file, "getbuffer", None)
+            if getbuffer is not None:
+                # Streamlit 的 UploadedFile 是内存中的 BytesIO：直接写出其缓冲区视图，不复制数据
+                with getbuffer() as buffer, buffer[uploaded_file.tell() :] as view:
+                    f.write(view)
+                    md5.update(view)
+                uploaded_file.seek(0, os.SEEK_END)
+            else:
+                # 其他文件对象分块读取，避免整个文件读入内存
+                while True:
+                    chunk = uploaded_file.read(COPY_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    md5.update(chunk)
         # 更新文件修改时间为当前，便于排序
         now = datetime.now().timestamp()
         os.utime(file_path, (now, now))
+        _remember_file_md5(file_path, md5.hexdigest())
         return file_path
     except Exception as exc:
         st.error(f"保存上传文件失败: {exc}")
         return None
 
 
-def get_uploaded_files(limit: Optional[int] = None) -> List[str]:
-    """按时间倒序返回用户上传的文件列表"""
-    if not os.path.exists(UPLOADED_DIR):
-        return []
+@lru_cache(maxsize=1)
+def _list_uploaded_files(dir_mtime_ns: int) -> Tuple[str, ...]:
+    """按时间倒序列出上传目录中的文件；目录修改时间仅作为缓存键"""
+    # scandir 的目录项自带文件类型，stat 结果也会缓存在目录项上
+    with os.scandir(UPLOADED_DIR) as entries:
+        dated = [
+            (entry.stat().st_mtime, entry.path)
+            for entry in entries
+            if entry.name.lower().endswith(SUPPORTED_FILE_EXTENSIONS) and entry.is_file()
+        ]
+    dated.sort(key=lambda item: item[0], reverse=True)
+    return tuple(path for _, path in dated)
 
-    files = []
-    for file in os.listdir(UPLOADED_DIR):
-        file_path = os.path.join(UPLOADED_DIR, file)
-        if os.path.isfile(file_path) and file.lower().endswith(SUPPORTED_FILE_EXTENSIONS):
-            files.append(file_path)
 
-    files.sort(key=lambda p: os.path.getmtime(p), reverse=True)
+def get_uploaded_files(limit: Optional[int] = None) -> List[str]:
+    """按时间倒序返回用户上传的文件列表
+
+    上传文件只新增不覆盖，目录内容未变化时直接复用上次的列表，每次 rerun 只需一次 stat。
+    """
+    try:
+        dir_mtime_ns = os.stat(UPLOADED_DIR).st_mtime_ns
+    except OSError:
+        return []
 
+    files = list(_list_uploaded_files(dir_mtime_ns))
     if limit is not None:
         return files[:limit]
     return files
 
 
+@lru_cache(maxsize=1)
+def _list_sample_files(dir_mtime_ns: int) -> Tuple[str, ...]:
+    """列出样例目录中的文件；目录修改时间仅作为缓存键"""
+    # scandir 的目录项自带文件类型，无需逐个 stat
+    with os.scandir(SAMPLE_DIR) as entries:
+        return tuple(
+            entry.path
+            for entry in entries
+            if entry.name.lower().endswith(SUPPORTED_FILE_EXTENSIONS) and entry.is_file()
+        )
+
+
 def get_sample_files() -> List[str]:
     """获取样例文件列表"""
-    contracts_dir = "contracts"
-    if not os.path.exists(contracts_dir):
+    try:
+        dir_mtime_ns = os.stat(SAMPLE_DIR).st_mtime_ns
+    except OSError:
         return []
-
-    sample_files = []
-    for file in os.listdir(contracts_dir):
-        file_path = os.path.join(contracts_dir, file)
-        if os.path.isfile(file_path) and file.lower().endswith(
-            SUPPORTED_FILE_EXTENSIONS
-        ):
-            sample_files.append(file_path)
-
-    return sample_files
+    return list(_list_sample_files(dir_mtime_ns))
 
 
 def copy_sample_file(sample_path: str) -> Optional[str]:
@@ -253,45 +584,138 @@ def copy_sample_file(sample_path: str) -> Optional[str]:
     try:
         suffix = os.path.splitext(sample_path)[1]
         with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-            with open(sample_path, "rb") as src:
-                tmp.write(src.read())
-            return tmp.name
+            tmp_path = tmp.name
+        # copyfile 在支持的平台上由内核完成复制（如 sendfile），不经过 Python 缓冲
+        shutil.copyfile(sample_path, tmp_path)
+        # 副本与样例内容相同，直接复用样例文件（跨会话缓存）的 MD5
+        sample_md5 = get_file_md5_cached(sample_path)
+        if sample_md5:
+            _remember_file_md5(tmp_path, sample_md5)
+        return tmp_path
     except Exception as e:
         st.error(f"复制样例文件失败: {str(e)}")
         return None
 
 
+def _decode_text_prefix(raw: bytes, is_whole_file: bool) -> Optional[str]:
+    """按候选编码依次解码文件开头的字节，返回首个解码成功的文本；均失败时返回 None
+
+    raw 可能在多字节字符中间截断，因此使用增量解码器，仅在 raw 即全文时才要求完整解码。
+    """
+    for bom, encoding in TXT_BOM_ENCODINGS:
+        if raw.startswith(bom):
+            candidates = [encoding]
+            break
+    else:
+        candidates = list(TXT_ENCODINGS)
+        if charset_normalizer is not None:
+            # 常见中文编码均失败时（如 big5、无 BOM 的 UTF-16）才用统计探测的结果
+            best = charset_normalizer.from_bytes(raw).best()
+            if best is not None:
+                candidates.append(best.encoding)
+
+    for encoding in candidates:
+        try:
+            return codecs.getincrementaldecoder(encoding)().decode(raw, final=is_whole_file)
+        except UnicodeDecodeError:
+            continue
+    return None
+
+
+def _extract_pdf_text_prefix(file_path: str, max_chars: int) -> str:
+    """逐页提取PDF文本，文本超过 max_chars 后不再解析后续页面
+
+    优先使用 PyMuPDF（C 实现），未安装时退化为 pdfminer。
+    """
+    try:
+        import fitz  # PyMuPDF
+    except ImportError:
+        return _extract_pdf_text_prefix_pdfminer(file_path, max_chars)
+
+    texts = []
+    length = 0
+    with fitz_lock, fitz.open(file_path) as doc:
+        for page in doc:
+            text = page.get_text()
+            texts.append(text)
+            length += len(text)
+            if length > max_chars:
+                break
+    return "".join(texts)
+
+
+def _extract_pdf_text_prefix_pdfminer(file_path: str, max_chars: int) -> str:
+    """与 pdfminer extract_text 逐页输出一致，但文本超过 max_chars 后不再解析后续页面"""
+    from pdfminer.converter import TextConverter
+    from pdfminer.layout import LAParams
+    from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+    from pdfminer.pdfpage import PDFPage
+
+    with open(file_path, "rb") as fp, StringIO() as output:
+        rsrcmgr = PDFResourceManager(caching=True)
+        device = TextConverter(rsrcmgr, output, laparams=LAParams())
+        interpreter = PDFPageInterpreter(rsrcmgr, device)
+        for page in PDFPage.get_pages(fp, caching=True):
+            interpreter.process_page(page)
+            if output.tell() > max_chars:
+                break
+        return output.getvalue()
+
+
+def _join_docx_paragraphs_prefix(paragraphs, max_chars: int) -> str:
+    """按换行拼接段落文本，长度超过 max_chars 后停止读取后续段落"""
+    texts = []
+    length = -1
+    for para in paragraphs:
+        text = para.text
+        texts.append(text)
+        length += len(text) + 1
+        if length > max_chars:
+            break
+    return "\n".join(texts)
+
+
 def preview_file_content(file_path: str) -> str:
-    """预览文件内容"""
+    """预览文件内容，结果按 (路径, 修改时间, 大小) 缓存，文件变化后自动失效"""
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return _preview_file_content(file_path, None, None)
+    return _preview_file_content(file_path, stat.st_mtime_ns, stat.st_size)
+
+
+@lru_cache(maxsize=64)
+def _preview_file_content(
+    file_path: str, mtime_ns: Optional[int], size: Optional[int]
+) -> str:
+    """提取文件预览文本；mtime_ns/size 仅作为缓存键"""
     try:
         file_ext = os.path.splitext(file_path)[1].lower()
 
         if file_ext == ".txt":
-            encodings = ["utf-8", "gbk", "gb2312", "gb18030"]
-            for encoding in encodings:
-                try:
-                    with open(file_path, "r", encoding=encoding) as f:
-                        content = f.read()
-                    return content[:2000] + "..." if len(content) > 2000 else content
-                except UnicodeDecodeError:
-                    continue
-            return "无法读取文件内容"
+            # 以二进制读取一次，所有候选编码都对同一段字节解码，避免只凭开头样本选定编码
+            with open(file_path, "rb") as f:
+                raw = f.read(TXT_PREVIEW_MAX_BYTES + 1)
+            is_whole_file = len(raw) <= TXT_PREVIEW_MAX_BYTES
+            content = _decode_text_prefix(raw[:TXT_PREVIEW_MAX_BYTES], is_whole_file)
+            if content is None:
+                return "无法读取文件内容"
+            content = content[: PREVIEW_MAX_CHARS + 1]
+            return content[:2000] + "..." if len(content) > 2000 else content
 
         elif file_ext == ".docx":
             try:
                 import docx
 
                 doc = docx.Document(file_path)
-                content = "\n".join([para.text for para in doc.paragraphs])
+                content = _join_docx_paragraphs_prefix(doc.paragraphs, PREVIEW_MAX_CHARS)
                 return content[:2000] + "..." if len(content) > 2000 else content
             except Exception as e:
                 return f"读取Word文档失败: {str(e)}"
 
         elif file_ext == ".pdf":
             try:
-                from pdfminer.high_level import extract_text
-
-                content = extract_text(file_path)
+                content = _extract_pdf_text_prefix(file_path, PREVIEW_MAX_CHARS)
                 return content[:2000] + "..." if len(content) > 2000 else content
             except Exception as e:
                 return f"读取PDF文件失败: {str(e)}"
@@ -315,21 +739,19 @@ def get_cache_file_paths(
     附加文件内容的短哈希，避免不同版本互相覆盖。
     如果文件名包含特殊字符，会进行清理以确保文件系统兼容性。
     """
-    import re
-
     if original_file_name:
         base_name = os.path.splitext(original_file_name)[0]
     else:
         base_name = os.path.splitext(os.path.basename(file_path))[0]
 
-    safe_name = re.sub(r"[^\w\u4e00-\u9fff-]", "_", base_name)
-    safe_name = re.sub(r"_+", "_", safe_name)
+    safe_name = _UNSAFE_NAME_CHARS_RE.sub("_", base_name)
+    safe_name = _UNDERSCORE_RUN_RE.sub("_", safe_name)
     safe_name = safe_name.strip("_")
 
     if not safe_name:
         safe_name = "unnamed_file"
 
-    content_hash = file_hash or compute_file_md5(file_path)
+    content_hash = file_hash or get_file_md5_cached(file_path)
     if content_hash:
         safe_name = f"{safe_name}_{content_hash[:12]}"
     else:
@@ -343,32 +765,87 @@ def get_cache_file_paths(
     return json_path, md_path
 
 
+@lru_cache(maxsize=1)
+def _cache_files_by_hash_prefix(
+    jsons_mtime_ns: int, mds_mtime_ns: Optional[int]
+) -> Dict[str, Tuple[str, str]]:
+    """建立 {内容哈希前12位: (json路径, md路径)} 映射；两个目录的修改时间仅作为缓存键"""
+    mapping: Dict[str, Tuple[str, str]] = {}
+    with os.scandir("jsons") as entries:
+        for entry in entries:
+            stem, ext = os.path.splitext(entry.name)
+            if ext != ".json" or len(stem) < 13 or stem[-13] != "_":
+                continue
+            md_path = os.path.join("mds", f"{stem}.md")
+            if os.path.exists(md_path):
+                mapping.setdefault(stem[-12:], (entry.path, md_path))
+    return mapping
+
+
+def _find_cache_files_by_hash(file_hash: str) -> Optional[Tuple[str, str]]:
+    """按内容哈希查找缓存文件，不依赖文件名（同一文件以不同名称上传时复用）
+
+    映射在 jsons/ 或 mds/ 目录增删文件后才重建，缓存未命中时不必每次扫描目录。
+    """
+    try:
+        jsons_mtime_ns = os.stat("jsons").st_mtime_ns
+    except OSError:
+        return None
+    try:
+        mds_mtime_ns = os.stat("mds").st_mtime_ns
+    except OSError:
+        mds_mtime_ns = None
+    return _cache_files_by_hash_prefix(jsons_mtime_ns, mds_mtime_ns).get(file_hash[:12])
+
+
+def _read_parse_cache(json_path: str, md_path: str) -> Optional[Tuple[Any, str]]:
+    """读取 (json结果, markdown文本)；任一文件不存在时返回 None，其余错误照常抛出"""
+    try:
+        # 直接打开并捕获不存在，省去事先的 exists 检查；md 较小，先读它以尽早发现未命中
+        with open(md_path, "r", encoding="utf-8") as f:
+            markdown_text = f.read()
+        with open(json_path, "rb") as f:
+            json_result = loads_json(f.read())
+    except FileNotFoundError:
+        return None
+    return json_result, markdown_text
+
+
 def load_cached_parse_result(
-    file_path: str, original_file_name: Optional[str] = None
+    file_path: str,
+    original_file_name: Optional[str] = None,
+    file_hash: Optional[str] = None,
 ) -> Optional[Dict[str, Any]]:
-    """从缓存加载解析结果"""
-    file_hash = compute_file_md5(file_path)
+    """从缓存加载解析结果
+
+    优先按文件名+哈希定位缓存；未命中时按内容哈希查找其他文件名下的同内容缓存。
+    调用方已知文件哈希时可通过 file_hash 传入。
+    """
+    file_hash = file_hash or get_file_md5_cached(file_path)
     json_path, md_path = get_cache_file_paths(
         file_path, original_file_name, file_hash=file_hash
     )
 
-    if os.path.exists(json_path) and os.path.exists(md_path):
-        try:
-            with open(json_path, "r", encoding="utf-8") as f:
-                json_result = json.load(f)
-            with open(md_path, "r", encoding="utf-8") as f:
-                markdown_text = f.read()
-
-            return {
-                "json_result": json_result,
-                "markdown_text": markdown_text,
-                "raw_text": preview_file_content(file_path),
-                "_cached": True,
-            }
-        except Exception as e:
-            print(f"加载缓存失败: {e}")
+    try:
+        cached = _read_parse_cache(json_path, md_path)
+        if cached is None and file_hash:
+            found = _find_cache_files_by_hash(file_hash)
+            if found:
+                cached = _read_parse_cache(*found)
+    except Exception as e:
+        print(f"加载缓存失败: {e}")
+        return None
 
-    return None
+    if cached is None:
+        return None
+
+    json_result, markdown_text = cached
+    return {
+        "json_result": json_result,
+        "markdown_text": markdown_text,
+        "raw_text": preview_file_content(file_path),
+        "_cached": True,
+    }
 
 
 def save_parse_result(
@@ -376,9 +853,10 @@ def save_parse_result(
     json_result: Dict[str, Any],
     markdown_text: str,
     original_file_name: Optional[str] = None,
+    file_hash: Optional[str] = None,
 ):
     """保存解析结果到缓存文件"""
-    file_hash = compute_file_md5(file_path)
+    file_hash = file_hash or get_file_md5_cached(file_path)
     json_path, md_path = get_cache_file_paths(
         file_path, original_file_name, file_hash=file_hash
     )
@@ -387,10 +865,9 @@ def save_parse_result(
     os.makedirs("mds", exist_ok=True)
 
     try:
-        with open(json_path, "w", encoding="utf-8") as f:
-            json.dump(json_result, f, ensure_ascii=False, indent=2)
-        with open(md_path, "w", encoding="utf-8") as f:
-            f.write(markdown_text)
+        # 原子替换：保存中途被打断也不会留下半截缓存，导致下次加载失败而重新解析
+        write_bytes_atomic(json_path, dumps_json_bytes(json_result))
+        write_bytes_atomic(md_path, markdown_text.encode("utf-8"))
         print(f"已保存解析结果: {json_path}, {md_path}")
     except Exception as e:
         print(f"保存解析结果失败: {e}")
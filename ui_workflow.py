@@ -1,7 +1,6 @@
 # ui_workflow.py
 
 import os
-import json
 import time
 import warnings
 import urllib3
@@ -12,6 +11,7 @@ import requests
 import atexit
 import threading
 from pathlib import Path
+from typing import Optional
 from dotenv import load_dotenv
 from contract_workflow import ContractWorkflow
 
@@ -19,6 +19,7 @@ from contract_workflow import ContractWorkflow
 PROJECT_ROOT = Path(__file__).resolve().parent
 load_dotenv(PROJECT_ROOT / ".env", override=False)
 from ui_utils import (
+    dumps_json_bytes,
     initialize_session_state,
     load_latest_result_by_filename,
     save_uploaded_file,
@@ -27,34 +28,48 @@ from ui_utils import (
     copy_sample_file,
     preview_file_content,
     load_cached_parse_result,
-    compute_file_md5,
+    get_file_md5_cached,
+    get_http_session,
 )
 from ui_workflow_processor import process_contract_workflow
 from ui_rendering import (
     render_preview_panel,
-    generate_html_layout,
+    generate_html_layout_cached,
     filter_issues_by_risk,
     render_suggestions,
+    RISK_LEVEL_ICONS,
+    RISK_LEVEL_LABELS,
+    RISK_FILTER_OPTIONS,
 )
 from ui_ocr_utils import call_online_parse_api
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 # MCP 服务管理
+MCP_HEALTH_URL = "http://localhost:7001/health"
+# 本地服务无需长超时与重试：连接/读取均快速失败
+MCP_HEALTH_TIMEOUT = (1, 2)
+MCP_STARTUP_TIMEOUT = 30
+MCP_POLL_INTERVAL = 0.2
+MCP_LOG_DIR = PROJECT_ROOT / "logs"
+# 风险点列表分页：每次 rerun 只构建当前页的 expander
+ISSUES_PAGE_SIZE = 20
 _mcp_process = None
 _mcp_lock = threading.Lock()
 
 
-def check_mcp_service():
+def check_mcp_service(session: Optional[requests.Session] = None):
     """检查MCP服务是否运行"""
     try:
-        response = requests.get("http://localhost:7001/health", timeout=5)
+        response = (session or get_http_session()).get(
+            MCP_HEALTH_URL, timeout=MCP_HEALTH_TIMEOUT
+        )
         return response.status_code == 200
     except:
         return False
 
 
-def start_mcp_service():
+def start_mcp_service(session: Optional[requests.Session] = None):
     """启动MCP服务（仅启动一次）"""
     global _mcp_process
     
@@ -64,14 +79,27 @@ def start_mcp_service():
             return True
         
         # 检查服务是否已在运行
-        if check_mcp_service():
+        if check_mcp_service(session):
             return True
         
         # 启动MCP服务
         try:
+            # 子进程输出写入日志文件：PIPE 无人读取时写满缓冲区会阻塞子进程
+            # 每次启动时轮转一次：上次运行的日志保留为 .1，新日志从空文件开始，避免无限增长
+            os.makedirs(MCP_LOG_DIR, exist_ok=True)
+            log_path = MCP_LOG_DIR / "mcp_service.log"
+            try:
+                os.replace(log_path, MCP_LOG_DIR / "mcp_service.log.1")
+            except FileNotFoundError:
+                pass
+            log_fd = os.open(
+                log_path,
+                os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_CLOEXEC", 0),
+                0o644,
+            )
             popen_kwargs = {
-                "stdout": subprocess.PIPE,
-                "stderr": subprocess.PIPE,
+                "stdout": log_fd,
+                "stderr": subprocess.STDOUT,
             }
             # Windows 上隐藏控制台窗口
             if sys.platform == "win32":
@@ -80,16 +108,23 @@ def start_mcp_service():
                 except AttributeError:
                     pass  # 如果常量不存在，忽略
             
-            _mcp_process = subprocess.Popen(
-                [sys.executable, "mcp_service.py"],
-                **popen_kwargs
-            )
+            try:
+                _mcp_process = subprocess.Popen(
+                    [sys.executable, "mcp_service.py"],
+                    **popen_kwargs
+                )
+            finally:
+                # 子进程已持有副本，父进程无需保留该描述符
+                os.close(log_fd)
             
-            # 等待服务启动
-            for i in range(30):
-                if check_mcp_service():
+            # 等待服务启动：短间隔轮询，子进程提前退出时立即失败
+            deadline = time.monotonic() + MCP_STARTUP_TIMEOUT
+            while time.monotonic() < deadline:
+                if check_mcp_service(session):
                     return True
-                time.sleep(1)
+                if _mcp_process.poll() is not None:
+                    return False
+                time.sleep(MCP_POLL_INTERVAL)
             
             return False
         except Exception as e:
@@ -118,9 +153,12 @@ atexit.register(cleanup_mcp_service)
 
 # 在模块加载时自动启动MCP服务
 if not check_mcp_service():
+    # 会话在主线程取得后传入，后台线程没有 ScriptRunContext，不直接访问 Streamlit 缓存
+    _mcp_session = get_http_session()
+
     # 使用线程异步启动，避免阻塞Streamlit
     def start_mcp_async():
-        if start_mcp_service():
+        if start_mcp_service(_mcp_session):
             print("✅ MCP服务已启动")
         else:
             print("⚠️ MCP服务启动失败，请手动启动: python mcp_service.py")
@@ -405,6 +443,21 @@ st.markdown(
 )
 
 
+@st.cache_data(show_spinner=False, max_entries=8)
+def _serialize_result_by_key(result_key: str, _result) -> bytes:
+    """按结果标识缓存下载用的JSON字节；下划线参数不参与 Streamlit 哈希"""
+    return dumps_json_bytes(_result)
+
+
+def _serialize_result(result) -> bytes:
+    """序列化分析结果用于下载，同一份结果在多次 rerun 间只序列化一次"""
+    content_hash = result.get("file_content_hash")
+    processing_time = result.get("processing_time")
+    if not content_hash or processing_time is None:
+        return dumps_json_bytes(result)
+    return _serialize_result_by_key(f"{content_hash}:{processing_time}", result)
+
+
 def _is_same_source(
     parsed_path,
     parsed_name,
@@ -455,12 +508,14 @@ def _ensure_current_file_ocr_result(
     ):
         return ocr_result
 
-    cached_result = load_cached_parse_result(current_file_path, current_file_name)
+    cached_result = load_cached_parse_result(
+        current_file_path, current_file_name, file_hash=current_hash
+    )
     if cached_result:
         st.session_state.ocr_parse_result = cached_result
         st.session_state.ocr_parsed_file_path = current_file_path
         st.session_state.ocr_parsed_original_file_name = current_file_name
-        st.session_state.ocr_parsed_file_hash = current_hash or compute_file_md5(
+        st.session_state.ocr_parsed_file_hash = current_hash or get_file_md5_cached(
             current_file_path
         )
         return cached_result
@@ -474,7 +529,7 @@ def main():
 
     saved_path = st.session_state.get("saved_file_path")
     if saved_path and not st.session_state.get("file_hash"):
-        st.session_state.file_hash = compute_file_md5(saved_path)
+        st.session_state.file_hash = get_file_md5_cached(saved_path)
 
     title_col, button_col = st.columns([2, 1])
     with title_col:
@@ -559,7 +614,7 @@ def main():
 
                         st.session_state.saved_file_path = saved_path
                         st.session_state.file_name = file_name
-                        st.session_state.file_hash = compute_file_md5(saved_path)
+                        st.session_state.file_hash = get_file_md5_cached(saved_path)
                         st.session_state.preview_content = preview_file_content(saved_path)
                         st.success(f"已上传并选中: {file_name}")
                         st.rerun()
@@ -590,7 +645,9 @@ def main():
 
                             st.session_state.saved_file_path = history_path
                             st.session_state.file_name = file_name
-                            st.session_state.file_hash = compute_file_md5(history_path)
+                            st.session_state.file_hash = get_file_md5_cached(
+                                history_path
+                            )
                             st.session_state.preview_content = preview_file_content(
                                 history_path
                             )
@@ -628,7 +685,9 @@ def main():
 
                             st.session_state.saved_file_path = temp_path
                             st.session_state.file_name = file_name
-                            st.session_state.file_hash = compute_file_md5(temp_path)
+                            st.session_state.file_hash = get_file_md5_cached(
+                                temp_path
+                            )
                             st.session_state.preview_content = preview_file_content(
                                 temp_path
                             )
@@ -679,7 +738,10 @@ def main():
                             if not ocr_url or not ocr_token:
                                 st.warning("请先在左侧『接口配置』中填写 OCR 接口地址和访问令牌，再调用 OCR 解析。")
                             else:
-                                ocr_result = call_online_parse_api(st.session_state.saved_file_path)
+                                ocr_result = call_online_parse_api(
+                                    st.session_state.saved_file_path,
+                                    file_hash=st.session_state.get("file_hash"),
+                                )
                                 st.session_state.ocr_parse_result = ocr_result
                                 if ocr_result:
                                     st.session_state.ocr_parsed_file_path = st.session_state.saved_file_path
@@ -705,9 +767,7 @@ def main():
                     
                     with btn2:
                         result = st.session_state.workflow_result
-                        json_bytes = json.dumps(result, ensure_ascii=False, indent=2).encode(
-                            "utf-8"
-                        )
+                        json_bytes = _serialize_result(result)
                         st.download_button(
                             label="📥 下载结果",
                             data=json_bytes,
@@ -732,7 +792,10 @@ def main():
                             if not ocr_url or not ocr_token:
                                 st.warning("请先在左侧『接口配置』中填写 OCR 接口地址和访问令牌，再调用 OCR 解析。")
                             else:
-                                ocr_result = call_online_parse_api(st.session_state.saved_file_path)
+                                ocr_result = call_online_parse_api(
+                                    st.session_state.saved_file_path,
+                                    file_hash=st.session_state.get("file_hash"),
+                                )
                                 st.session_state.ocr_parse_result = ocr_result
                                 if ocr_result:
                                     st.session_state.ocr_parsed_file_path = st.session_state.saved_file_path
@@ -837,7 +900,11 @@ def main():
                     if ocr_result:
                         json_result = ocr_result.get("json_result")
                     if json_result:
-                        html_content = generate_html_layout(json_result, all_issues)
+                        html_content = generate_html_layout_cached(
+                            json_result,
+                            all_issues,
+                            st.session_state.get("ocr_parsed_file_hash"),
+                        )
                         st.components.v1.html(html_content, height=840, scrolling=True)
                     else:
                         st.warning(
@@ -864,9 +931,8 @@ def main():
                 statistics = risk_analysis.get("statistics", {})
 
                 if view == "风险点":
-                    risk_levels = ["全部", "重大风险", "一般风险", "低风险"]
                     selected_level = st.radio(
-                        "选择风险等级", risk_levels, horizontal=True, key="risk_filter", label_visibility="collapsed"
+                        "选择风险等级", RISK_FILTER_OPTIONS, horizontal=True, key="risk_filter", label_visibility="collapsed"
                     )
 
                     filtered_issues = filter_issues_by_risk(all_issues, selected_level)
@@ -879,27 +945,34 @@ def main():
                         st.metric("风险评分", f"{risk_score}/100")
                     with col3:
                         risk_level = statistics.get("risk_level", "低")
-                        level_color = {"高": "🔴", "中": "🟡", "低": "🟢"}.get(
-                            risk_level, "⚪"
-                        )
+                        level_color = RISK_LEVEL_ICONS.get(risk_level, "⚪")
                         st.metric("风险等级", f"{level_color} {risk_level}")
 
                     if filtered_issues:
                         st.markdown("---")
-                        
-                        for i, issue in enumerate(filtered_issues, 1):
+
+                        page_count = -(-len(filtered_issues) // ISSUES_PAGE_SIZE)
+                        page_num = 1
+                        if page_count > 1:
+                            page_num = st.number_input(
+                                f"页码（共 {page_count} 页）",
+                                min_value=1,
+                                max_value=page_count,
+                                value=1,
+                                step=1,
+                                key=f"issue_page_{selected_level}",
+                            )
+                        page_start = (page_num - 1) * ISSUES_PAGE_SIZE
+                        page_issues = filtered_issues[
+                            page_start : page_start + ISSUES_PAGE_SIZE
+                        ]
+
+                        for i, issue in enumerate(page_issues, page_start + 1):
                             risk_level = issue.get("风险等级", "低")
                             issue_type = issue.get("类型", "未知类型")
 
-                            if risk_level == "高":
-                                risk_color = "🔴"
-                                risk_label = "重大风险"
-                            elif risk_level == "中":
-                                risk_color = "🟡"
-                                risk_label = "一般风险"
-                            else:
-                                risk_color = "🟢"
-                                risk_label = "低风险"
+                            risk_color = RISK_LEVEL_ICONS.get(risk_level, "🟢")
+                            risk_label = RISK_LEVEL_LABELS.get(risk_level, "低风险")
 
                             # 将风险类型和风险等级合并到expander标题中
                             expander_title = f"{risk_color} {issue_type} {risk_label}"
@@ -944,9 +1017,7 @@ def main():
                             )
                         with col3:
                             risk_level = statistics.get("risk_level", "低")
-                            level_color = {"高": "🔴", "中": "🟡", "低": "🟢"}.get(
-                                risk_level, "⚪"
-                            )
+                            level_color = RISK_LEVEL_ICONS.get(risk_level, "⚪")
                             st.metric("风险等级", f"{level_color} {risk_level}")
 
                         st.markdown("---")
@@ -3,6 +3,7 @@
 
 import streamlit as st
 from contract_workflow import ContractWorkflow
+from ui_utils import get_http_session
 
 
 def process_contract_workflow(file_path: str):
@@ -15,6 +16,7 @@ def process_contract_workflow(file_path: str):
             llm_api_base_url=st.session_state.get("llm_api_base_url"),
             llm_api_key=st.session_state.get("llm_api_key"),
             llm_model_name=st.session_state.get("llm_model_name"),
+            http_session=get_http_session(),
         )
 
         # 步骤1: 文档解析/分析